@@ -0,0 +1,11 @@
+"""Headless background remover.
+
+Usage: python bgremove.py in/ -o out/ --recursive --workers 8 --model isnet
+Run with --help for all options.
+"""
+import sys
+
+from bgremover.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
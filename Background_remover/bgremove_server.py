@@ -0,0 +1,11 @@
+"""Background removal as a local HTTP service.
+
+Usage: python bgremove_server.py --port 8080 --workers 2 --model u2net
+Run with --help for all options.
+"""
+import sys
+
+from bgremover.server import main
+
+if __name__ == "__main__":
+    sys.exit(main())
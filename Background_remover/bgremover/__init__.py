@@ -0,0 +1 @@
+"""Shared background-removal core used by the desktop and mobile apps."""
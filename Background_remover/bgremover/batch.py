@@ -0,0 +1,240 @@
+"""Parallel batch engine.
+
+Images are fanned out to a process pool. Each worker keeps one warm model
+and caps its ONNX Runtime thread count, so N workers share the cores
+instead of each one trying to use all of them. Results are yielded in
+completion order so callers can report progress as it happens.
+
+With ``micro_batch`` the engine instead runs one process with several
+inference threads whose model calls are batched together (see
+microbatch.py).
+"""
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image
+
+from .cache import get_cache, remove_cached
+from .microbatch import DEFAULT_MAX_WAIT_MS, batch_stats
+from .microbatch import configure as configure_microbatch
+from .sessions import DEFAULT_MODEL, get_pool, get_session, resolve_model_name
+from .tiled import TILED_PIXEL_THRESHOLD, remove_background_tiled, should_tile
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+# Rough footprint of a worker per loaded model (u2net weights alone are
+# ~170 MB, plus runtime buffers and decoded images)
+WORKER_MEMORY_MB = 400
+
+BatchResult = namedtuple("BatchResult", "input_path output_path ok error elapsed cached")
+
+
+def find_images(directory):
+    """Image files directly inside ``directory``, sorted by name"""
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def batch_jobs(directory, output_dir):
+    """(input, output) pairs for every image in ``directory``"""
+    return [
+        (path, os.path.join(output_dir, f"no_bg_{os.path.basename(path)}"))
+        for path in find_images(directory)
+    ]
+
+
+def output_format(path):
+    """Pillow format name implied by a file extension"""
+    lower = path.lower()
+    if lower.endswith(('.jpg', '.jpeg')):
+        return 'JPEG'
+    if lower.endswith('.webp'):
+        return 'WEBP'
+    return 'PNG'
+
+
+def save_output(image, path, quality=95, fmt=None):
+    """Save a cut-out to a path or file object.
+
+    The format comes from the file extension unless ``fmt`` is given.
+    """
+    fmt = fmt or output_format(path)
+    if fmt == 'JPEG':
+        # JPEG has no alpha channel; flatten onto white
+        if image.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        image.convert('RGB').save(path, 'JPEG', quality=quality)
+    elif fmt == 'WEBP':
+        image.save(path, 'WEBP', quality=quality)
+    else:
+        image.save(path, 'PNG')
+
+
+def available_memory_mb():
+    """Memory available to new processes in MB, or None if unknown.
+
+    This counts reclaimable page cache (MemAvailable), not just free pages.
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.virtual_memory().available / (1024 * 1024)
+
+
+def default_worker_count(models=1):
+    """Worker processes to use; override with BGREMOVER_WORKERS.
+
+    One per core, but every worker loads its own copy of each model, so the
+    default is also capped by the available memory.
+    """
+    configured = os.environ.get("BGREMOVER_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    workers = os.cpu_count() or 1
+    memory = available_memory_mb()
+    if memory is not None:
+        workers = min(workers, int(memory // (WORKER_MEMORY_MB * max(1, models))))
+    return max(1, workers)
+
+
+def threads_per_worker(workers):
+    """Split the cores evenly between workers"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def process_file(input_path, output_path, model=DEFAULT_MODEL, cache=None,
+                 fast_mask=False, tile_threshold=TILED_PIXEL_THRESHOLD):
+    """Remove the background of one file and save it.
+
+    Images above ``tile_threshold`` pixels go through the memory-bounded
+    tiled path, whatever the output format (and bypass the cache, whose hit
+    path would rebuild the full RGBA image). Returns ``(seconds taken,
+    cache hit)``.
+    """
+    start = time.monotonic()
+    if tile_threshold:
+        with Image.open(input_path) as image:
+            size = image.size
+        if should_tile(size, tile_threshold):
+            remove_background_tiled(input_path, output_path, model=model,
+                                    fmt=output_format(output_path))
+            return time.monotonic() - start, False
+
+    with open(input_path, 'rb') as f:
+        data = f.read()
+    output, hit = remove_cached(data, model=model, cache=cache, fast_mask=fast_mask)
+    save_output(output, output_path)
+    return time.monotonic() - start, hit
+
+
+# Per-worker state, set by _init_worker in each pool process
+_worker_model = DEFAULT_MODEL
+_worker_cache = None
+_worker_options = {}
+
+
+def _init_worker(model, threads, use_cache, options):
+    global _worker_model, _worker_cache, _worker_options
+    # rembg reads OMP_NUM_THREADS when it builds the ORT session options
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    _worker_model = model
+    _worker_cache = get_cache() if use_cache else None
+    _worker_options = options
+    get_session(model)
+
+
+def _worker_process_file(input_path, output_path):
+    return process_file(input_path, output_path, model=_worker_model,
+                        cache=_worker_cache, **_worker_options)
+
+
+class BatchEngine:
+    """Runs (input_path, output_path) jobs across a pool of worker processes"""
+
+    def __init__(self, model=DEFAULT_MODEL, workers=None, threads=None,
+                 use_cache=True, fast_mask=False, tile_threshold=TILED_PIXEL_THRESHOLD,
+                 pipeline=False, micro_batch=0, batch_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.model = model
+        self.use_cache = use_cache
+        self.pipeline = pipeline
+        self.micro_batch = micro_batch
+        self.stage_stats = None
+        self.batch_stats = None
+        if micro_batch > 1:
+            configure_microbatch(micro_batch, batch_wait_ms)
+        # Forwarded to process_file for every job
+        self.options = {"fast_mask": fast_mask, "tile_threshold": tile_threshold}
+        self.workers = max(1, workers or default_worker_count())
+        self.threads = threads or threads_per_worker(self.workers)
+        self._cancelled = False
+        self._pipeline = None
+
+    def cancel(self):
+        """Stop handing out new work; files already running still finish"""
+        self._cancelled = True
+        if self._pipeline is not None:
+            self._pipeline.cancel()
+
+    def run(self, jobs):
+        """Yield a BatchResult for every job, in completion order"""
+        jobs = list(jobs)
+        if not jobs:
+            return
+
+        if self.pipeline or self.workers == 1 or self.micro_batch > 1:
+            # One process: overlap decode/encode with inference instead
+            yield from self._run_pipelined(jobs)
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(jobs)),
+            initializer=_init_worker,
+            initargs=(self.model, self.threads, self.use_cache, self.options),
+        ) as pool:
+            futures = {
+                pool.submit(_worker_process_file, input_path, output_path): (input_path, output_path)
+                for input_path, output_path in jobs
+            }
+            for future in as_completed(futures):
+                input_path, output_path = futures[future]
+                try:
+                    elapsed, hit = future.result()
+                    yield BatchResult(input_path, output_path, True, None, elapsed, hit)
+                except Exception as e:
+                    yield BatchResult(input_path, output_path, False, str(e), 0.0, False)
+
+                if self._cancelled:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+    def _run_pipelined(self, jobs):
+        from .pipeline import Pipeline
+
+        # Batching needs concurrent callers: one inference thread per batch slot
+        self._pipeline = Pipeline(model=self.model, use_cache=self.use_cache,
+                                  infer_workers=max(1, self.micro_batch), **self.options)
+        try:
+            for result in self._pipeline.run(jobs):
+                yield result
+                if self._cancelled:
+                    break
+        finally:
+            self.stage_stats = self._pipeline.stage_stats()
+            if resolve_model_name(self.model) in get_pool().loaded_models():
+                self.batch_stats = batch_stats(get_session(self.model))
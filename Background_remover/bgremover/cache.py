@@ -0,0 +1,207 @@
+"""Content-addressed result cache.
+
+Results are keyed on a hash of the input file bytes, the model name and
+the removal parameters. Only the output alpha mask is stored (as an 8-bit
+PNG, which compresses very well), and a hit rebuilds the cut-out from the
+original pixels without running inference. The cache is size-limited and
+evicts the least recently used entries; file mtimes track recency.
+
+Parameters that only act on the finished cut-out (``bgcolor``,
+``only_mask``) are applied after the lookup and stay out of the key.
+Alpha matting also recomputes the foreground colours, which a mask can't
+rebuild, so matted results aren't cached.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+
+from PIL import Image, ImageOps
+
+from .fastmask import remove_background_fast
+from .onnx_tuning import model_variant
+from .sessions import DEFAULT_MODEL, remove_background
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "BGREMOVER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "bgremover"),
+)
+DEFAULT_CACHE_MB = int(os.environ.get("BGREMOVER_CACHE_MB", "512"))
+
+# rembg parameters applied to the cut-out rather than the mask
+FINISH_PARAMS = ("bgcolor", "only_mask")
+
+
+class ResultCache:
+    """On-disk LRU cache of alpha masks"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_mb=DEFAULT_CACHE_MB):
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def make_key(data, model=DEFAULT_MODEL, params=None):
+        """Hash of input bytes + model (and its precision) + removal parameters"""
+        digest = hashlib.sha256(data)
+        digest.update(model_variant(model).encode())
+        digest.update(json.dumps(params or {}, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def get_mask(self, key):
+        """Cached mask for ``key`` or None"""
+        path = self._path(key)
+        try:
+            with Image.open(path) as mask:
+                mask.load()
+            # Bump recency for LRU eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return mask
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put_mask(self, key, mask):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file and rename so readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            mask.convert("L").save(f, "PNG", optimize=True)
+        with self._lock:
+            # Re-putting a key replaces the old file
+            try:
+                self._size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            self._size += os.path.getsize(path)
+            over_limit = self._size > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def _entries(self):
+        """(path, size, mtime) for every cached mask"""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self):
+        """Delete least recently used masks until under the size limit"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            size = sum(entry[1] for entry in entries)
+            # Leave some headroom so we don't evict on every put
+            target = self.max_bytes * 0.9
+            for path, entry_size, _ in entries:
+                if size <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= entry_size
+            self._size = size
+
+    def stats_text(self):
+        return f"cache: {self.hits} hits / {self.misses} misses"
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache in DEFAULT_CACHE_DIR"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
+
+
+def lookup(cache, data, image, model=DEFAULT_MODEL, fast_mask=False, **params):
+    """Look ``data`` up in ``cache``.
+
+    Returns ``(key, output)``; ``output`` is the rebuilt cut-out on a hit and
+    None on a miss. Hits and misses are counted on the cache. ``params`` must
+    not include FINISH_PARAMS; with alpha matting the key is None too, as
+    those results aren't cached.
+    """
+    if params.get("alpha_matting"):
+        return None, None
+    key_params = dict(params, fast_mask=True) if fast_mask else params
+    key = cache.make_key(data, model, key_params)
+    mask = cache.get_mask(key)
+    if mask is not None:
+        # Same orientation fix rembg applies before inference
+        output = ImageOps.exif_transpose(image).convert("RGBA")
+        if mask.size == output.size:
+            output.putalpha(mask)
+            cache.record(True)
+            return key, output
+    cache.record(False)
+    return key, None
+
+
+def run_model(image, model=DEFAULT_MODEL, fast_mask=False, **params):
+    """Run inference on a decoded image"""
+    if fast_mask:
+        return remove_background_fast(image, model=model)
+    return remove_background(image, model=model, **params)
+
+
+def finish(output, bgcolor=None, only_mask=False):
+    """Apply rembg's ``bgcolor`` / ``only_mask`` to an RGBA cut-out"""
+    if only_mask:
+        return output.getchannel("A")
+    if bgcolor is not None:
+        background = Image.new("RGBA", output.size, tuple(bgcolor))
+        background.alpha_composite(output)
+        return background
+    return output
+
+
+def remove_cached(data, model=DEFAULT_MODEL, cache=None, fast_mask=False, **params):
+    """Remove the background of encoded image bytes.
+
+    Returns ``(image, hit)``. With ``cache=None`` this always runs the model.
+    ``fast_mask`` runs the model at low resolution (see fastmask.py).
+    """
+    finish_params = {name: params.pop(name) for name in FINISH_PARAMS if name in params}
+    image = Image.open(io.BytesIO(data))
+    key = None
+    if cache is not None:
+        key, output = lookup(cache, data, image, model, fast_mask, **params)
+        if output is not None:
+            return finish(output, **finish_params), True
+
+    output = run_model(image, model, fast_mask, **params)
+    if key is not None:
+        cache.put_mask(key, output.getchannel("A"))
+    return finish(output, **finish_params), False
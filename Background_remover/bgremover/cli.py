@@ -0,0 +1,265 @@
+"""Non-interactive command line interface.
+
+    bgremove in/ -o out/ --recursive --workers 8 --model isnet --format webp
+    bgremove "shots/*.jpg" -o out/
+    cat photo.jpg | bgremove - > cutout.png
+
+Nothing here imports Tk, so headless start-up stays fast. A summary of
+every file is printed at the end (``--summary json`` for machines) and the
+exit code is 0 when everything succeeded, 1 when any file failed and 2
+when there was nothing to do.
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import time
+
+from .batch import IMAGE_EXTENSIONS, BatchEngine, default_worker_count, save_output
+from .cache import get_cache, remove_cached
+from .microbatch import DEFAULT_MAX_WAIT_MS
+from .onnx_tuning import GRAPH_OPTIMIZATIONS, PRECISIONS, OrtConfig, configure
+from .sessions import AVAILABLE_MODELS, DEFAULT_MODEL
+from .tiled import TILED_PIXEL_THRESHOLD
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_NO_INPUT = 2
+
+OUTPUT_FORMATS = ('png', 'webp', 'jpg')
+FORMAT_NAMES = {'png': 'PNG', 'webp': 'WEBP', 'jpg': 'JPEG'}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="bgremove",
+        description="Remove image backgrounds without the GUI.",
+    )
+    parser.add_argument("inputs", nargs="+",
+                        help="image files, directories, glob patterns, or - for stdin")
+    parser.add_argument("-o", "--output",
+                        help="output directory (default: <input dir>/background_removed)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="descend into sub-directories (and ** in glob patterns)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help=f"worker processes (default: {default_worker_count()})")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL, choices=AVAILABLE_MODELS)
+    parser.add_argument("-f", "--format", default="png", choices=OUTPUT_FORMATS,
+                        help="output image format")
+    parser.add_argument("--fast-mask", action="store_true",
+                        help="run the model at low resolution and refine the mask edges")
+    parser.add_argument("--tile-threshold", type=int, default=TILED_PIXEL_THRESHOLD,
+                        help="process images above this many pixels in strips (0 disables)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="single process with overlapped decode/infer/encode stages")
+    parser.add_argument("--micro-batch", type=int, default=0, metavar="N",
+                        help="one process with N inference threads whose model calls "
+                             "are batched together")
+    parser.add_argument("--batch-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="longest an image waits for a batch to fill (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always run the model, ignoring the result cache")
+    parser.add_argument("--summary", default="text", choices=("text", "json"),
+                        help="summary format printed at the end")
+    parser.add_argument("--precision", choices=PRECISIONS,
+                        help="model weights (default: BGREMOVER_ORT_PRECISION or fp32)")
+    parser.add_argument("--graph-opt", choices=GRAPH_OPTIMIZATIONS,
+                        help="ONNX Runtime graph optimisation level (default: all)")
+    return parser
+
+
+def glob_root(pattern):
+    """Leading directories of a glob pattern that contain no wildcards"""
+    parts = []
+    for part in os.path.normpath(pattern).split(os.sep)[:-1]:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    if parts == [""]:
+        return os.sep
+    return os.path.abspath(os.sep.join(parts) or os.curdir)
+
+
+def expand_inputs(patterns, recursive=False):
+    """Expand files, directories and glob patterns into (path, root) pairs.
+
+    ``root`` is the directory the output layout is made relative to: the
+    directory itself, or the part of a glob pattern before any wildcard.
+    """
+    found = []
+    seen = set()
+
+    def add(path, root):
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            found.append((path, root))
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            root = os.path.abspath(pattern)
+            if recursive:
+                for dirpath, dirnames, filenames in os.walk(root):
+                    # Never re-process our own default output folder
+                    dirnames[:] = sorted(d for d in dirnames if d != "background_removed")
+                    for name in sorted(filenames):
+                        if name.lower().endswith(IMAGE_EXTENSIONS):
+                            add(os.path.join(dirpath, name), root)
+            else:
+                for name in sorted(os.listdir(root)):
+                    path = os.path.join(root, name)
+                    if os.path.isfile(path) and name.lower().endswith(IMAGE_EXTENSIONS):
+                        add(path, root)
+        elif os.path.isfile(pattern):
+            add(pattern, os.path.dirname(os.path.abspath(pattern)))
+        else:
+            root = glob_root(pattern)
+            for path in sorted(glob.glob(pattern, recursive=recursive)):
+                if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                    add(path, root)
+    return found
+
+
+def output_path_for(input_path, root, output_dir, fmt):
+    """Mirror the input layout under ``output_dir`` as no_bg_<name>.<fmt>"""
+    if output_dir is None:
+        output_dir = os.path.join(root, "background_removed")
+    relative_dir = os.path.relpath(os.path.dirname(input_path), root)
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.normpath(os.path.join(output_dir, relative_dir, f"no_bg_{stem}.{fmt}"))
+
+
+def unique_output_path(output_path, input_path, taken):
+    """``output_path``, or a variant carrying the source extension if another
+    input already maps to it (x.jpg and x.png in one folder)"""
+    base, ext = os.path.splitext(output_path)
+    source_ext = os.path.splitext(input_path)[1].lstrip(".").lower()
+    candidate = output_path
+    number = 1
+    # Lower-cased so case-insensitive file systems can't collide either
+    while candidate.lower() in taken:
+        suffix = f"_{source_ext}" if number == 1 else f"_{source_ext}{number}"
+        candidate = f"{base}{suffix}{ext}"
+        number += 1
+    taken.add(candidate.lower())
+    return candidate
+
+
+def run_stdin(args):
+    """Read image bytes from stdin and write the cut-out to stdout"""
+    start = time.monotonic()
+    result = {"input": "-", "output": "-", "ok": True, "error": None, "cached": False}
+    try:
+        cache = None if args.no_cache else get_cache()
+        output, result["cached"] = remove_cached(sys.stdin.buffer.read(), model=args.model,
+                                                 cache=cache, fast_mask=args.fast_mask)
+        buffer = io.BytesIO()
+        save_output(output, buffer, fmt=FORMAT_NAMES[args.format])
+        sys.stdout.buffer.write(buffer.getvalue())
+        sys.stdout.buffer.flush()
+    except Exception as e:
+        result.update(ok=False, error=str(e))
+    result["elapsed"] = round(time.monotonic() - start, 3)
+    return [result]
+
+
+def run_files(args, inputs):
+    jobs = []
+    taken = set()
+    for input_path, root in inputs:
+        output_path = output_path_for(input_path, root, args.output, args.format)
+        unique_path = unique_output_path(output_path, input_path, taken)
+        if unique_path != output_path:
+            print(f"! {input_path}: {output_path} is already used, writing {unique_path}",
+                  file=sys.stderr)
+            output_path = unique_path
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        jobs.append((input_path, output_path))
+
+    engine = BatchEngine(model=args.model, workers=args.workers,
+                         use_cache=not args.no_cache, fast_mask=args.fast_mask,
+                         tile_threshold=args.tile_threshold, pipeline=args.pipeline,
+                         micro_batch=args.micro_batch, batch_wait_ms=args.batch_wait_ms)
+    results = []
+    for result in engine.run(jobs):
+        results.append({
+            "input": result.input_path,
+            "output": result.output_path if result.ok else None,
+            "ok": result.ok,
+            "error": result.error,
+            "cached": result.cached,
+            "elapsed": round(result.elapsed, 3),
+        })
+        if args.summary == "text":
+            mark = "✓" if result.ok else "✗"
+            detail = "" if result.ok else f": {result.error}"
+            print(f"{mark} {result.input_path}{detail}", file=sys.stderr)
+    return results, engine.stage_stats, engine.batch_stats
+
+
+def print_summary(results, fmt, elapsed, stream, stage_stats=None, batch_stats=None):
+    failed = [r for r in results if not r["ok"]]
+    hits = sum(1 for r in results if r["ok"] and r["cached"])
+    misses = len(results) - len(failed) - hits
+    if fmt == "json":
+        json.dump({
+            "total": len(results),
+            "succeeded": len(results) - len(failed),
+            "failed": len(failed),
+            "cache_hits": hits,
+            "cache_misses": misses,
+            "elapsed": round(elapsed, 3),
+            "stages": stage_stats,
+            "micro_batching": batch_stats,
+            "files": results,
+        }, stream, ensure_ascii=False, indent=2)
+        stream.write("\n")
+    else:
+        print(f"{len(results) - len(failed)}/{len(results)} images processed "
+              f"in {elapsed:.1f}s ({len(failed)} failed, "
+              f"cache: {hits} hits / {misses} misses)", file=stream)
+        for name, stats in (stage_stats or {}).items():
+            print(f"  {name:<7} {stats['utilisation']:6.1%} busy "
+                  f"({stats['workers']} threads, {stats['items']} items)", file=stream)
+        if batch_stats:
+            print(f"  batches: {batch_stats['batches']} of {batch_stats['mean_batch']} images "
+                  f"on average (largest {batch_stats['largest_batch']}, "
+                  f"waited {batch_stats['mean_wait_ms']} ms)", file=stream)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    start = time.monotonic()
+
+    if args.precision or args.graph_opt:
+        # Goes through the environment, so worker processes pick it up too
+        config = OrtConfig.from_env()
+        config.precision = args.precision or config.precision
+        config.graph_optimization = args.graph_opt or config.graph_optimization
+        configure(config)
+
+    stage_stats = batch_stats = None
+    if "-" in args.inputs:
+        if len(args.inputs) > 1:
+            print("bgremove: '-' cannot be combined with other inputs", file=sys.stderr)
+            return EXIT_NO_INPUT
+        results = run_stdin(args)
+        # stdout carries the image, so the summary goes to stderr
+        summary_stream = sys.stderr
+    else:
+        inputs = expand_inputs(args.inputs, recursive=args.recursive)
+        if not inputs:
+            print("bgremove: no images matched the given inputs", file=sys.stderr)
+            return EXIT_NO_INPUT
+        results, stage_stats, batch_stats = run_files(args, inputs)
+        summary_stream = sys.stdout if args.summary == "json" else sys.stderr
+
+    print_summary(results, args.summary, time.monotonic() - start, summary_stream,
+                  stage_stats, batch_stats)
+    return EXIT_OK if all(r["ok"] for r in results) else EXIT_FAILURES
+
+
+if __name__ == "__main__":
+    sys.exit(main())
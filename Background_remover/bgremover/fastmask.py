@@ -0,0 +1,106 @@
+"""Fast mask mode.
+
+The rembg models infer at a fixed small size (320px for u2net, 1024px for
+isnet), so pushing a full-resolution photo through ``remove()`` mostly
+pays for pre- and post-processing at full size. Here the model runs on a
+downscaled copy and the predicted mask is brought back to full size with a
+fast guided filter (He & Sun, 2015): the filter coefficients are solved at
+low resolution, upsampled, and applied to the full-resolution luminance so
+mask edges snap to real image edges. The cut-out is then assembled with
+NumPy on the original pixels.
+"""
+import numpy as np
+from PIL import Image, ImageOps
+
+from .sessions import DEFAULT_MODEL, get_session
+
+FAST_MASK_MAX_SIDE = 1024
+GUIDED_RADIUS = 4
+GUIDED_EPS = 1e-3
+
+
+def box_filter(x, r):
+    """Mean over (2r+1)x(2r+1) windows, clamped at the borders"""
+    h, w = x.shape
+    integral = np.zeros((h + 1, w + 1), dtype=np.float64)
+    integral[1:, 1:] = np.cumsum(np.cumsum(x, axis=0), axis=1)
+
+    rows = np.arange(h)
+    cols = np.arange(w)
+    y0 = np.clip(rows - r, 0, h)
+    y1 = np.clip(rows + r + 1, 0, h)
+    x0 = np.clip(cols - r, 0, w)
+    x1 = np.clip(cols + r + 1, 0, w)
+
+    total = (integral[np.ix_(y1, x1)] - integral[np.ix_(y0, x1)]
+             - integral[np.ix_(y1, x0)] + integral[np.ix_(y0, x0)])
+    area = (y1 - y0)[:, None] * (x1 - x0)[None, :]
+    return (total / area).astype(np.float32)
+
+
+def guided_coefficients(guide, mask, radius=GUIDED_RADIUS, eps=GUIDED_EPS):
+    """Solve the guided filter at low resolution; returns (a, b)"""
+    mean_i = box_filter(guide, radius)
+    mean_p = box_filter(mask, radius)
+    cov_ip = box_filter(guide * mask, radius) - mean_i * mean_p
+    var_i = box_filter(guide * guide, radius) - mean_i * mean_i
+
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    return box_filter(a, radius), box_filter(b, radius)
+
+
+def upsample(array, size):
+    """Bilinear resize of a float32 array to ``size`` (width, height)"""
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    return np.asarray(Image.fromarray(array).resize(size, Image.Resampling.BILINEAR))
+
+
+def downscale(image, max_side=FAST_MASK_MAX_SIDE):
+    """RGB copy of ``image`` that fits in ``max_side`` x ``max_side``"""
+    small = image.convert('RGB')
+    small.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+    return small
+
+
+def predict_small_mask(image, model=DEFAULT_MODEL, max_side=FAST_MASK_MAX_SIDE):
+    """Run the model on a downscaled copy; returns (small RGB, small mask)"""
+    small = downscale(image, max_side)
+    mask = get_session(model).predict(small)[0].convert('L')
+    if mask.size != small.size:
+        mask = mask.resize(small.size, Image.Resampling.BILINEAR)
+    return small, mask
+
+
+def luminance(image):
+    return np.asarray(image.convert('L'), dtype=np.float32) / 255.0
+
+
+def refine_mask(full_image, small_image, small_mask,
+                radius=GUIDED_RADIUS, eps=GUIDED_EPS):
+    """Full-resolution alpha (uint8 array) from a low-resolution mask"""
+    a, b = guided_coefficients(
+        luminance(small_image),
+        np.asarray(small_mask, dtype=np.float32) / 255.0,
+        radius, eps,
+    )
+    guide = luminance(full_image)
+    alpha = upsample(a, full_image.size) * guide
+    alpha += upsample(b, full_image.size)
+    np.clip(alpha, 0.0, 1.0, out=alpha)
+    return (alpha * 255.0 + 0.5).astype(np.uint8)
+
+
+def compose_cutout(image, alpha):
+    """RGBA cut-out from an RGB image and a same-size uint8 alpha array"""
+    rgba = np.empty((image.height, image.width, 4), dtype=np.uint8)
+    rgba[..., :3] = np.asarray(image)
+    rgba[..., 3] = alpha
+    return Image.fromarray(rgba)
+
+
+def remove_background_fast(image, model=DEFAULT_MODEL, max_side=FAST_MASK_MAX_SIDE):
+    """Cut-out with the model run at low resolution and an edge-refined mask"""
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    small_image, small_mask = predict_small_mask(image, model, max_side)
+    return compose_cutout(image, refine_mask(image, small_image, small_mask))
@@ -0,0 +1,164 @@
+"""Mask backends for devices that shouldn't run the big model themselves.
+
+Whichever backend runs the model, it only sees a downscaled copy of the
+photo and returns an alpha mask at that size. The mask is refined against
+the full-size photo and composited on the device (see fastmask.py), so
+full-resolution pixels never leave it and each request moves a small JPEG
+one way and a grayscale PNG the other.
+
+- ``RemoteBackend`` posts the small image to a worker running
+  ``bgremover.server`` (``POST /mask``);
+- ``LocalBackend`` runs a model on the device, by default the small
+  ``u2netp``.
+
+``MaskRemover`` tries its backends in order. A backend that fails (no
+network, timeout, busy worker) is skipped for ``retry_after`` seconds so
+working offline doesn't pay the timeout on every image; the last backend
+is always tried. Every backend keeps latency statistics.
+"""
+import io
+import os
+import time
+import urllib.request
+from collections import deque, namedtuple
+from urllib.parse import urlencode
+
+from PIL import Image, ImageOps
+
+from .fastmask import FAST_MASK_MAX_SIDE, compose_cutout, downscale, refine_mask
+from .sessions import DEFAULT_MODEL, get_session
+
+DEFAULT_LOCAL_MODEL = "u2netp"
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_RETRY_AFTER = 30.0
+JPEG_QUALITY = 90
+
+# Worker base URL, e.g. http://192.168.1.20:8080 (unset: on-device only)
+WORKER_URL = os.environ.get("BGREMOVER_WORKER_URL", "")
+
+# Latencies kept per backend for the p95
+RECENT_SAMPLES = 50
+
+Removal = namedtuple("Removal", "image backend mask_seconds total_seconds")
+
+
+class LatencyStats:
+    """Successful call latencies and failure count of one backend"""
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total = 0.0
+        self.last = None
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.recent.append(seconds)
+
+    def fail(self):
+        self.failures += 1
+
+    def as_dict(self):
+        recent = sorted(self.recent)
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "mean_ms": round(1000 * self.total / self.count, 1) if self.count else None,
+            "p95_ms": round(1000 * recent[int(0.95 * (len(recent) - 1))], 1) if recent else None,
+            "last_ms": round(1000 * self.last, 1) if self.last is not None else None,
+        }
+
+
+class RemoteBackend:
+    """Mask from a ``bgremover.server`` worker"""
+
+    name = "remote"
+
+    def __init__(self, url, model=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+
+    def predict_mask(self, image):
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=JPEG_QUALITY)
+        request = urllib.request.Request(
+            f"{self.url}/mask?{urlencode({'model': self.model})}",
+            data=buffer.getvalue(),
+            headers={"Content-Type": "image/jpeg"},
+            method="POST",
+        )
+        # URLError (offline, refused, 429/5xx) and timeouts are OSErrors
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return Image.open(io.BytesIO(response.read())).convert("L")
+
+
+class LocalBackend:
+    """Mask from a model running on this device"""
+
+    name = "on-device"
+
+    def __init__(self, model=DEFAULT_LOCAL_MODEL):
+        self.model = model
+
+    def predict_mask(self, image):
+        return get_session(self.model).predict(image)[0].convert("L")
+
+
+class MaskRemover:
+    """Background removal through the first backend that answers"""
+
+    def __init__(self, backends, max_side=FAST_MASK_MAX_SIDE, retry_after=DEFAULT_RETRY_AFTER):
+        if not backends:
+            raise ValueError("MaskRemover needs at least one backend")
+        self.backends = list(backends)
+        self.max_side = max_side
+        self.retry_after = retry_after
+        self.latency = {backend.name: LatencyStats() for backend in self.backends}
+        self._skip_until = {}
+
+    def remove(self, image):
+        """Cut-out of ``image`` as a ``Removal`` (image, backend name, timings)"""
+        start = time.monotonic()
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        small = downscale(image, self.max_side)
+
+        last = len(self.backends) - 1
+        for index, backend in enumerate(self.backends):
+            if index < last and self._skip_until.get(backend.name, 0) > time.monotonic():
+                continue
+            began = time.monotonic()
+            try:
+                mask = backend.predict_mask(small)
+            except Exception:
+                self.latency[backend.name].fail()
+                self._skip_until[backend.name] = time.monotonic() + self.retry_after
+                if index == last:
+                    raise
+                continue
+            mask_seconds = time.monotonic() - began
+            self.latency[backend.name].record(mask_seconds)
+            self._skip_until.pop(backend.name, None)
+
+            if mask.size != small.size:
+                mask = mask.resize(small.size, Image.Resampling.BILINEAR)
+            cutout = compose_cutout(image, refine_mask(image, small, mask))
+            return Removal(cutout, backend.name, mask_seconds, time.monotonic() - start)
+
+    def stats(self):
+        """Latency statistics per backend name"""
+        return {name: stats.as_dict() for name, stats in self.latency.items()}
+
+
+def create_remover(worker_url=None, remote_model=DEFAULT_MODEL, local_model=DEFAULT_LOCAL_MODEL,
+                   timeout=DEFAULT_TIMEOUT):
+    """Remote worker first (when a URL is configured), on-device model as fallback"""
+    worker_url = WORKER_URL if worker_url is None else worker_url
+    backends = []
+    if worker_url:
+        backends.append(RemoteBackend(worker_url, remote_model, timeout))
+    backends.append(LocalBackend(local_model))
+    return MaskRemover(backends)
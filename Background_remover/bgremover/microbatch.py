@@ -0,0 +1,261 @@
+"""Dynamic micro-batching of inference requests.
+
+rembg runs every image as its own ``[1, C, H, W]`` ONNX call. When several
+threads share one session (the pipeline's inference workers), a
+``MicroBatcher`` takes the place of the session's ONNX session: callers
+hand it their preprocessed input as usual, a scheduler thread stacks the
+inputs that arrive together into one ``[N, C, H, W]`` call and gives each
+caller back its own slice of the outputs. Larger calls keep the CPU's
+cores and caches busier than several small ones.
+
+A batch closes when it holds ``max_batch`` requests or when the oldest
+request has waited ``max_wait_ms``, so that is the most batching can add
+to an image's latency. The scheduler only waits while it expects more
+callers: threads that are waiting on a call, or whose last call returned
+within ``CALLER_WINDOW_SECONDS`` and are likely preparing the next one.
+A thread that is alone (the desktop app, a single CLI image, a lone
+request after a burst) runs straight away.
+
+``close()`` (called by the session pool when it evicts the session) lets
+the scheduler thread finish the pending requests and exit, so the ONNX
+session can be freed; later calls run unbatched.
+
+Most exported models have a fixed batch size of 1. ``new_tuned_session``
+can write a copy with a symbolic batch dimension (needs the ``onnx``
+package); without one, or if a batched call fails, requests still go
+through the scheduler but run one by one.
+
+Settings come from ``BGREMOVER_MICROBATCH`` (largest batch, 0 or 1 turns
+batching off) and ``BGREMOVER_MICROBATCH_WAIT_MS``, so worker processes
+inherit them, and can be changed with ``configure()``.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+DEFAULT_MAX_BATCH = 4
+DEFAULT_MAX_WAIT_MS = 10.0
+
+# A thread whose call returned within this window is expected to call
+# again (about the time a pipeline worker spends between two images)
+CALLER_WINDOW_SECONDS = 0.25
+
+logger = logging.getLogger(__name__)
+
+
+def get_settings():
+    """``(max_batch, max_wait_ms)`` for sessions created from now on"""
+    return (int(os.environ.get("BGREMOVER_MICROBATCH", "0")),
+            float(os.environ.get("BGREMOVER_MICROBATCH_WAIT_MS", str(DEFAULT_MAX_WAIT_MS))))
+
+
+def configure(max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+    """Batch sessions created from now on (and in child processes)"""
+    os.environ["BGREMOVER_MICROBATCH"] = str(max_batch)
+    os.environ["BGREMOVER_MICROBATCH_WAIT_MS"] = str(max_wait_ms)
+
+
+def has_dynamic_batch(inner_session):
+    """True if every input of the ONNX session accepts any batch size"""
+    try:
+        inputs = inner_session.get_inputs()
+    except AttributeError:
+        return False
+    return all(not (arg.shape and isinstance(arg.shape[0], int)) for arg in inputs)
+
+
+class _Request:
+    __slots__ = ("output_names", "feed", "signature", "enqueued", "done", "outputs", "error")
+
+    def __init__(self, output_names, feed):
+        self.output_names = output_names
+        self.feed = feed
+        # Requests can share a call only if they ask for the same outputs
+        # with inputs of the same shape and type
+        self.signature = (
+            tuple(output_names) if output_names is not None else None,
+            tuple(sorted((name, value.shape[1:], value.dtype.str)
+                         for name, value in feed.items())),
+        )
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.outputs = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Drop-in for an ``onnxruntime.InferenceSession`` that batches ``run`` calls"""
+
+    def __init__(self, inner_session, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.inner_session = inner_session
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.batchable = has_dynamic_batch(inner_session)
+        self._pending = deque()
+        self._callers = {}  # thread id -> when its last call returned, None while waiting
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._largest = 0
+        self._wait_seconds = 0.0
+
+    def run(self, output_names, input_feed, run_options=None):
+        if run_options is not None:
+            return self.inner_session.run(output_names, input_feed, run_options)
+
+        request = _Request(output_names, input_feed)
+        ident = threading.get_ident()
+        with self._cond:
+            if self._closed:
+                return self.inner_session.run(output_names, input_feed)
+            self._callers[ident] = None
+            self._pending.append(request)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._schedule, daemon=True,
+                                                name="bgremover-microbatch")
+                self._thread.start()
+            self._cond.notify()
+        request.done.wait()
+        with self._cond:
+            self._callers[ident] = time.monotonic()
+        if request.error is not None:
+            raise request.error
+        return request.outputs
+
+    def close(self):
+        """Stop the scheduler thread once the pending requests have run"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __getattr__(self, name):
+        return getattr(self.inner_session, name)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "batched": self.batchable,
+                "batches": self._batches,
+                "requests": self._requests,
+                "mean_batch": round(self._requests / self._batches, 2) if self._batches else 0.0,
+                "largest_batch": self._largest,
+                "mean_wait_ms": (round(1000 * self._wait_seconds / self._requests, 2)
+                                 if self._requests else 0.0),
+            }
+
+    # Scheduler thread
+
+    def _expected_callers(self, now):
+        # Caller holds self._cond
+        for ident, returned in list(self._callers.items()):
+            if returned is not None and now - returned > CALLER_WINDOW_SECONDS:
+                del self._callers[ident]
+        return max(1, len(self._callers))
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            # Without batching there is nothing to wait for
+            limit = self.max_batch if self.batchable else 1
+            deadline = self._pending[0].enqueued + self.max_wait
+            while True:
+                now = time.monotonic()
+                wanted = min(limit, self._expected_callers(now))
+                if len(self._pending) >= wanted or now >= deadline or self._closed:
+                    break
+                self._cond.wait(deadline - now)
+
+            first = self._pending.popleft()
+            batch = [first]
+            for request in list(self._pending):
+                if len(batch) == limit:
+                    break
+                if request.signature == first.signature:
+                    self._pending.remove(request)
+                    batch.append(request)
+            return batch
+
+    def _schedule(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.monotonic()
+            if len(batch) > 1:
+                self._run_batched(batch)
+            else:
+                self._run_one(batch[0])
+            with self._stats_lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._largest = max(self._largest, len(batch))
+                self._wait_seconds += sum(started - request.enqueued for request in batch)
+
+    def _run_one(self, request):
+        try:
+            request.outputs = self.inner_session.run(request.output_names, request.feed)
+        except Exception as e:
+            request.error = e
+        request.done.set()
+
+    def _run_batched(self, batch):
+        first = batch[0]
+        feed = {name: np.concatenate([request.feed[name] for request in batch])
+                for name in first.feed}
+        try:
+            outputs = self.inner_session.run(first.output_names, feed)
+        except Exception:
+            # Typically a reshape baked to batch size 1 somewhere in the graph
+            logger.warning("Batched inference failed; running requests one by one",
+                           exc_info=True)
+            self.batchable = False
+            for request in batch:
+                self._run_one(request)
+            return
+
+        offset = 0
+        for request in batch:
+            size = len(next(iter(request.feed.values())))
+            request.outputs = [output[offset:offset + size] for output in outputs]
+            offset += size
+            request.done.set()
+
+
+def batched_session(model_name, max_batch, max_wait_ms):
+    """rembg session for ``model_name`` whose inference goes through a MicroBatcher"""
+    from .onnx_tuning import new_tuned_session
+
+    try:
+        session = new_tuned_session(model_name, dynamic_batch=True)
+    except ImportError:
+        logger.warning("The 'onnx' package is needed for a batched copy of %s; "
+                       "running one image per call", model_name)
+        session = new_tuned_session(model_name)
+    session.inner_session = MicroBatcher(session.inner_session, max_batch, max_wait_ms)
+    return session
+
+
+def close_batching(session):
+    """Stop the MicroBatcher of a session, if it has one"""
+    inner = getattr(session, "inner_session", None)
+    if isinstance(inner, MicroBatcher):
+        inner.close()
+
+
+def batch_stats(session):
+    """MicroBatcher statistics of a session, or None if it isn't batched"""
+    inner = getattr(session, "inner_session", None)
+    return inner.stats() if isinstance(inner, MicroBatcher) else None
@@ -0,0 +1,311 @@
+"""ONNX Runtime tuning for CPU-only deployments.
+
+rembg builds every session with default ``SessionOptions``. Here the
+options come from an ``OrtConfig`` instead:
+
+- ``precision``: ``fp32`` (the stock model), ``int8`` (dynamically
+  quantised weights) or ``int8-static`` (weights and activations,
+  calibrated on sample images). Quantised models are written once under
+  ``BGREMOVER_MODELS_DIR`` and reused;
+- graph optimisation level, intra/inter-op thread counts and execution
+  mode;
+- CPU memory arena and memory pattern planning, which trade resident
+  memory for allocation speed.
+
+The process-wide config is read from ``BGREMOVER_ORT_*`` environment
+variables (so batch worker processes inherit it) and can be replaced with
+``configure()``. A quantised model keeps rembg's own pre- and
+post-processing: only the ONNX file behind the session changes.
+"""
+import os
+import tempfile
+import threading
+
+from .sessions import resolve_model_name
+
+PRECISIONS = ("fp32", "int8", "int8-static")
+GRAPH_OPTIMIZATIONS = ("disabled", "basic", "extended", "all")
+EXECUTION_MODES = ("sequential", "parallel")
+
+MODELS_DIR = os.environ.get(
+    "BGREMOVER_MODELS_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "bgremover", "models"),
+)
+
+
+def _env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off")
+
+
+class OrtConfig:
+    """Inference settings for every session this process creates"""
+
+    def __init__(self, precision="fp32", graph_optimization="all", intra_op_threads=0,
+                 inter_op_threads=0, execution_mode="sequential", cpu_mem_arena=True,
+                 mem_pattern=True):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Choose one of: {', '.join(PRECISIONS)}")
+        if graph_optimization not in GRAPH_OPTIMIZATIONS:
+            raise ValueError(f"Unknown graph optimisation '{graph_optimization}'. "
+                             f"Choose one of: {', '.join(GRAPH_OPTIMIZATIONS)}")
+        if execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode '{execution_mode}'. "
+                             f"Choose one of: {', '.join(EXECUTION_MODES)}")
+        self.precision = precision
+        self.graph_optimization = graph_optimization
+        # 0 means "ONNX Runtime decides" (or OMP_NUM_THREADS when set)
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.execution_mode = execution_mode
+        self.cpu_mem_arena = cpu_mem_arena
+        self.mem_pattern = mem_pattern
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            precision=os.environ.get("BGREMOVER_ORT_PRECISION", "fp32"),
+            graph_optimization=os.environ.get("BGREMOVER_ORT_GRAPH_OPT", "all"),
+            intra_op_threads=int(os.environ.get("BGREMOVER_ORT_INTRA_THREADS", "0")),
+            inter_op_threads=int(os.environ.get("BGREMOVER_ORT_INTER_THREADS", "0")),
+            execution_mode=os.environ.get("BGREMOVER_ORT_EXECUTION_MODE", "sequential"),
+            cpu_mem_arena=_env_flag("BGREMOVER_ORT_CPU_ARENA", True),
+            mem_pattern=_env_flag("BGREMOVER_ORT_MEM_PATTERN", True),
+        )
+
+    def to_env(self):
+        """Environment variables that reproduce this config in a child process"""
+        return {
+            "BGREMOVER_ORT_PRECISION": self.precision,
+            "BGREMOVER_ORT_GRAPH_OPT": self.graph_optimization,
+            "BGREMOVER_ORT_INTRA_THREADS": str(self.intra_op_threads),
+            "BGREMOVER_ORT_INTER_THREADS": str(self.inter_op_threads),
+            "BGREMOVER_ORT_EXECUTION_MODE": self.execution_mode,
+            "BGREMOVER_ORT_CPU_ARENA": "1" if self.cpu_mem_arena else "0",
+            "BGREMOVER_ORT_MEM_PATTERN": "1" if self.mem_pattern else "0",
+        }
+
+    def as_dict(self):
+        return {
+            "precision": self.precision,
+            "graph_optimization": self.graph_optimization,
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "execution_mode": self.execution_mode,
+            "cpu_mem_arena": self.cpu_mem_arena,
+            "mem_pattern": self.mem_pattern,
+        }
+
+    def session_options(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = {
+            "disabled": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[self.graph_optimization]
+        options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if self.execution_mode == "parallel"
+                                  else ort.ExecutionMode.ORT_SEQUENTIAL)
+
+        # Same fallback rembg uses: batch workers split the cores through
+        # OMP_NUM_THREADS
+        omp_threads = int(os.environ.get("OMP_NUM_THREADS", "0"))
+        options.intra_op_num_threads = self.intra_op_threads or omp_threads
+        options.inter_op_num_threads = self.inter_op_threads or omp_threads
+        options.enable_cpu_mem_arena = self.cpu_mem_arena
+        options.enable_mem_pattern = self.mem_pattern
+        return options
+
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def get_config():
+    """Process-wide ``OrtConfig`` (from the environment unless configured)"""
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = OrtConfig.from_env()
+        return _config
+
+
+def configure(config):
+    """Use ``config`` for sessions created from now on (and in child processes)"""
+    global _config
+    with _config_lock:
+        _config = config
+    os.environ.update(config.to_env())
+
+
+def model_variant(model, config=None):
+    """Name identifying the weights a session runs, e.g. ``u2net`` or ``u2net.int8``"""
+    name = resolve_model_name(model)
+    precision = (config or get_config()).precision
+    return name if precision == "fp32" else f"{name}.{precision}"
+
+
+def rembg_session_class(model_name):
+    from rembg.sessions import sessions_class
+    for session_class in sessions_class:
+        if session_class.name() == model_name:
+            return session_class
+    raise ValueError(f"rembg has no session for model '{model_name}'")
+
+
+def fp32_model_path(model_name):
+    """Path of the stock ONNX file (downloaded by rembg on first use)"""
+    return str(rembg_session_class(model_name).download_models())
+
+
+def quantized_model_path(model_name, precision, models_dir=MODELS_DIR):
+    return os.path.join(models_dir, f"{model_name}.{precision}.onnx")
+
+
+class _FeedRecorder:
+    """Stands in for a session's ONNX session and keeps the inputs it is given"""
+
+    def __init__(self, inner_session):
+        self.inner_session = inner_session
+        self.feeds = []
+
+    def run(self, output_names, input_feed, *args, **kwargs):
+        self.feeds.append(input_feed)
+        return self.inner_session.run(output_names, input_feed, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.inner_session, name)
+
+
+def calibration_feeds(model_name, images):
+    """Model inputs for ``images``, preprocessed exactly as rembg does it"""
+    from rembg import new_session
+
+    session = new_session(model_name)
+    recorder = _FeedRecorder(session.inner_session)
+    session.inner_session = recorder
+    for image in images:
+        session.predict(image.convert("RGB"))
+    return recorder.feeds
+
+
+def _write_atomically(path, write):
+    """Call ``write(tmp_path)`` and rename the result to ``path``.
+
+    Each writer gets its own temp file, so workers producing the same
+    model at once can't clobber each other's output before the rename.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".onnx.tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return path
+
+
+def quantize_model(model, precision="int8", calibration_images=None, models_dir=MODELS_DIR,
+                   force=False):
+    """Write the quantised variant of ``model`` and return its path.
+
+    ``int8`` quantises weights only and needs no data. ``int8-static`` also
+    quantises activations, with ranges calibrated on ``calibration_images``
+    (a handful of typical inputs).
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    if precision not in ("int8", "int8-static"):
+        raise ValueError(f"'{precision}' is not a quantised precision")
+    model_name = resolve_model_name(model)
+    path = quantized_model_path(model_name, precision, models_dir)
+    if os.path.exists(path) and not force:
+        return path
+
+    source = fp32_model_path(model_name)
+    if precision == "int8":
+        return _write_atomically(path, lambda tmp_path: quantize_dynamic(
+            source, tmp_path, weight_type=QuantType.QUInt8))
+
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, quantize_static
+
+    if not calibration_images:
+        raise ValueError("int8-static quantisation needs calibration images")
+    feeds = calibration_feeds(model_name, calibration_images)
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._feeds = iter(feeds)
+
+        def get_next(self):
+            return next(self._feeds, None)
+
+    return _write_atomically(path, lambda tmp_path: quantize_static(
+        source, tmp_path, Reader(), quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8))
+
+
+def dynamic_batch_model(source, models_dir=MODELS_DIR, force=False):
+    """Copy of the ONNX file ``source`` that accepts any batch size; returns its path.
+
+    Exported models usually pin the batch dimension to 1. Only the graph
+    inputs and outputs are relabelled; ONNX Runtime infers the rest.
+    """
+    import onnx
+
+    name = os.path.splitext(os.path.basename(source))[0]
+    path = os.path.join(models_dir, f"{name}.dynbatch.onnx")
+    if os.path.exists(path) and not force:
+        return path
+
+    model = onnx.load(source)
+    graph = model.graph
+    initializers = {tensor.name for tensor in graph.initializer}
+    for value in list(graph.input) + list(graph.output):
+        dims = value.type.tensor_type.shape.dim
+        if value.name not in initializers and dims:
+            dims[0].dim_param = "batch"
+    # Stored intermediate shapes would still say 1
+    del graph.value_info[:]
+
+    return _write_atomically(path, lambda tmp_path: onnx.save(model, tmp_path))
+
+
+def new_tuned_session(model_name, config=None, dynamic_batch=False):
+    """rembg session for ``model_name`` built with ``config``'s options and weights.
+
+    ``dynamic_batch`` loads a copy of the model that accepts batched inputs
+    (see microbatch.py).
+    """
+    config = config or get_config()
+    options = config.session_options()
+    session_class = rembg_session_class(model_name)
+
+    path = None
+    if config.precision != "fp32":
+        path = quantized_model_path(model_name, config.precision)
+        if not os.path.exists(path):
+            if config.precision == "int8-static":
+                raise FileNotFoundError(
+                    f"{path} not found; create it with "
+                    f"'python -m bgremover.ort_bench quantize --model {model_name} "
+                    f"--precision int8-static --calibration DIR'")
+            path = quantize_model(model_name, config.precision)
+    if dynamic_batch:
+        path = dynamic_batch_model(path or fp32_model_path(model_name))
+    if path is not None:
+        # Same pre/post-processing, different ONNX file
+        session_class = type(f"{session_class.__name__}Tuned", (session_class,), {
+            "download_models": classmethod(lambda cls, *args, **kwargs: path),
+        })
+    return session_class(model_name, options)
@@ -0,0 +1,198 @@
+"""Quantise models and compare ONNX Runtime configurations.
+
+    python -m bgremover.ort_bench quantize --model u2net --precision int8
+    python -m bgremover.ort_bench quantize --model isnet --precision int8-static --calibration samples/
+    python -m bgremover.ort_bench bench samples/ --model u2net --config int8 --config int8,graph=basic,arena=0
+
+``bench`` runs every configuration in a fresh process, so peak resident
+memory is measured per configuration, and reports load time, latency per
+image (mean and p95), throughput, peak RSS and the IoU of each mask
+against the fp32 baseline (which always runs first). A configuration is
+a precision followed by optional ``key=value`` settings: ``graph``,
+``intra``, ``inter``, ``mode``, ``arena`` and ``pattern``.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .batch import find_images
+from .onnx_tuning import PRECISIONS, OrtConfig, configure, new_tuned_session, quantize_model
+from .sessions import AVAILABLE_MODELS, DEFAULT_MODEL, resolve_model_name
+
+CONFIG_KEYS = {
+    "graph": ("graph_optimization", str),
+    "intra": ("intra_op_threads", int),
+    "inter": ("inter_op_threads", int),
+    "mode": ("execution_mode", str),
+    "arena": ("cpu_mem_arena", lambda value: value not in ("0", "false", "off")),
+    "pattern": ("mem_pattern", lambda value: value not in ("0", "false", "off")),
+}
+
+
+def parse_config(spec):
+    """``int8,graph=basic,arena=0`` -> OrtConfig"""
+    precision, *settings = spec.split(",")
+    kwargs = {"precision": precision}
+    for setting in settings:
+        key, _, value = setting.partition("=")
+        if key not in CONFIG_KEYS:
+            raise ValueError(f"Unknown setting '{key}' in '{spec}'. "
+                             f"Choose from: {', '.join(CONFIG_KEYS)}")
+        name, convert = CONFIG_KEYS[key]
+        kwargs[name] = convert(value)
+    return OrtConfig(**kwargs)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _bench_one(model_name, config_dict, image_paths, runs):
+    """Child process: load the session, time every image, return masks"""
+    config = OrtConfig(**config_dict)
+    configure(config)
+    start = time.monotonic()
+    session = new_tuned_session(model_name, config)
+    load_seconds = time.monotonic() - start
+
+    images = [Image.open(path).convert("RGB") for path in image_paths]
+    session.predict(images[0])  # warm-up
+
+    latencies = []
+    masks = []
+    for run in range(runs):
+        for image in images:
+            start = time.monotonic()
+            mask = session.predict(image)[0]
+            latencies.append(time.monotonic() - start)
+            if run == 0:
+                masks.append(np.asarray(mask.convert("L")) > 127)
+    return {
+        "load_seconds": load_seconds,
+        "latencies": latencies,
+        "peak_rss_mb": peak_rss_mb(),
+        "masks": masks,
+    }
+
+
+def mask_iou(a, b):
+    union = np.logical_or(a, b).sum()
+    if not union:
+        return 1.0
+    return float(np.logical_and(a, b).sum() / union)
+
+
+def bench(model, configs, image_paths, runs=3):
+    """One result dict per configuration, the fp32 baseline first"""
+    model_name = resolve_model_name(model)
+    baseline = OrtConfig()
+    configs = [baseline] + [config for config in configs if config.as_dict() != baseline.as_dict()]
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    baseline_masks = None
+    for config in configs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            measured = pool.submit(_bench_one, model_name, config.as_dict(),
+                                   image_paths, runs).result()
+        masks = measured.pop("masks")
+        if baseline_masks is None:
+            baseline_masks = masks
+        latencies = sorted(measured.pop("latencies"))
+        results.append({
+            "config": config.as_dict(),
+            "load_seconds": round(measured["load_seconds"], 3),
+            "mean_ms": round(1000 * sum(latencies) / len(latencies), 1),
+            "p95_ms": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 1),
+            "images_per_second": round(len(latencies) / sum(latencies), 2),
+            "peak_rss_mb": (round(measured["peak_rss_mb"], 1)
+                            if measured["peak_rss_mb"] is not None else None),
+            "iou": round(float(np.mean([mask_iou(a, b) for a, b in zip(masks, baseline_masks)])), 4),
+        })
+    return results
+
+
+def config_label(config):
+    label = [config["precision"]]
+    defaults = OrtConfig().as_dict()
+    for key, (name, _) in CONFIG_KEYS.items():
+        value = config[name]
+        if value != defaults[name]:
+            label.append(f"{key}={int(value) if isinstance(value, bool) else value}")
+    return ",".join(label)
+
+
+def print_results(results, stream=sys.stdout):
+    print(f"{'config':<28} {'load s':>7} {'mean ms':>8} {'p95 ms':>7} {'img/s':>6} "
+          f"{'RSS MB':>7} {'IoU':>7}", file=stream)
+    for result in results:
+        rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+        print(f"{config_label(result['config']):<28} {result['load_seconds']:>7.2f} "
+              f"{result['mean_ms']:>8.1f} {result['p95_ms']:>7.1f} "
+              f"{result['images_per_second']:>6.2f} {rss:>7} {result['iou']:>7.4f}", file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bgremover.ort_bench",
+                                     description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    quantize = commands.add_parser("quantize", help="write a quantised model variant")
+    quantize.add_argument("--model", default=DEFAULT_MODEL, choices=AVAILABLE_MODELS)
+    quantize.add_argument("--precision", default="int8", choices=PRECISIONS[1:])
+    quantize.add_argument("--calibration", help="folder of typical images (int8-static)")
+    quantize.add_argument("--force", action="store_true", help="overwrite an existing file")
+
+    run = commands.add_parser("bench", help="compare configurations against fp32")
+    run.add_argument("images", help="folder of test images")
+    run.add_argument("--model", default=DEFAULT_MODEL, choices=AVAILABLE_MODELS)
+    run.add_argument("--config", action="append", default=[],
+                     help="configuration to compare, e.g. int8,graph=extended (repeatable)")
+    run.add_argument("--runs", type=int, default=3, help="passes over the images")
+    run.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "quantize":
+        images = None
+        if args.calibration:
+            images = [Image.open(path).convert("RGB") for path in find_images(args.calibration)]
+        path = quantize_model(args.model, args.precision, calibration_images=images,
+                              force=args.force)
+        print(f"{path} ({os.path.getsize(path) / (1024 * 1024):.1f} MB)")
+        return 0
+
+    image_paths = find_images(args.images)
+    if not image_paths:
+        print(f"No images found in {args.images}", file=sys.stderr)
+        return 2
+    configs = [parse_config(spec) for spec in args.config] or [OrtConfig(precision="int8")]
+    results = bench(args.model, configs, image_paths, runs=args.runs)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print_results(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Pipelined decode -> infer -> encode batch processing.
+
+Decoding (file read, cache lookup, ``Image.open`` + ``load``) and encoding
+(``save``, cache store) are I/O and codec bound, so each runs on its own
+thread pool. Inference runs on a separate executor. The stages are joined
+by bounded queues: when the model falls behind, decoders block instead of
+piling decoded images up in memory, and vice versa for the encoders.
+
+Each stage records how long its threads were busy, so ``stage_stats()``
+shows which one is the bottleneck: a stage close to 100% utilisation is
+limiting throughput, the others are waiting on it.
+"""
+import io
+import queue
+import threading
+import time
+
+from PIL import Image
+
+from .batch import BatchResult, output_format, save_output
+from .cache import get_cache, lookup, run_model
+from .sessions import DEFAULT_MODEL
+from .tiled import TILED_PIXEL_THRESHOLD, remove_background_tiled, should_tile
+
+_STOP = object()
+
+
+class StageStats:
+    """Busy time and item count for one pipeline stage"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.items += 1
+            self.busy += seconds
+
+    def utilisation(self, wall):
+        if wall <= 0:
+            return 0.0
+        return min(1.0, self.busy / (wall * self.workers))
+
+    def as_dict(self, wall):
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "busy": round(self.busy, 3),
+            "utilisation": round(self.utilisation(wall), 3),
+        }
+
+
+class _Item:
+    """A job travelling through the stages"""
+
+    __slots__ = ("input_path", "output_path", "start", "data", "image",
+                 "output", "key", "hit", "tiled")
+
+    def __init__(self, input_path, output_path):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.start = time.monotonic()
+        self.data = None
+        self.image = None
+        self.output = None
+        self.key = None
+        self.hit = False
+        self.tiled = False
+
+
+class Pipeline:
+    """Streams (input_path, output_path) jobs through three stages"""
+
+    def __init__(self, model=DEFAULT_MODEL, decode_workers=2, infer_workers=1,
+                 encode_workers=2, queue_size=4, use_cache=True, fast_mask=False,
+                 tile_threshold=TILED_PIXEL_THRESHOLD):
+        self.model = model
+        self.queue_size = queue_size
+        self.cache = get_cache() if use_cache else None
+        self.fast_mask = fast_mask
+        self.tile_threshold = tile_threshold
+        self.stats = {
+            "decode": StageStats("decode", decode_workers),
+            "infer": StageStats("infer", infer_workers),
+            "encode": StageStats("encode", encode_workers),
+        }
+        self.wall = 0.0
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def stage_stats(self):
+        """Per-stage utilisation of the last run"""
+        return {name: stats.as_dict(self.wall) for name, stats in self.stats.items()}
+
+    def bottleneck(self):
+        return max(self.stats.values(), key=lambda s: s.utilisation(self.wall)).name
+
+    def run(self, jobs):
+        """Yield a BatchResult for every job, in completion order"""
+        jobs = list(jobs)
+        if not jobs:
+            return
+
+        started = time.monotonic()
+        job_q = queue.Queue()
+        infer_q = queue.Queue(self.queue_size)
+        encode_q = queue.Queue(self.queue_size)
+        results_q = queue.Queue()
+        for job in jobs:
+            job_q.put(job)
+
+        stages = [
+            (self.stats["decode"], job_q, infer_q, self._decode),
+            (self.stats["infer"], infer_q, encode_q, self._infer),
+            (self.stats["encode"], encode_q, None, self._encode),
+        ]
+        threads = []
+        for stats, in_q, out_q, work in stages:
+            stage_threads = []
+            for _ in range(stats.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(stats, in_q, out_q, results_q, work),
+                    daemon=True,
+                )
+                thread.start()
+                stage_threads.append(thread)
+            threads.append((in_q, stage_threads))
+
+        # First stage stops once the job list is drained
+        for _ in range(self.stats["decode"].workers):
+            job_q.put(_STOP)
+
+        try:
+            for _ in range(len(jobs)):
+                result = results_q.get()
+                yield result
+                if self._cancelled.is_set():
+                    break
+        finally:
+            self._cancelled.set()
+            self._shutdown(threads)
+            self.wall = time.monotonic() - started
+
+    def _shutdown(self, threads):
+        # Stop stages front to back so each one drains into the next
+        for index, (in_q, stage_threads) in enumerate(threads):
+            for thread in stage_threads:
+                thread.join()
+            if index + 1 < len(threads):
+                next_q, next_threads = threads[index + 1]
+                for _ in next_threads:
+                    next_q.put(_STOP)
+
+    def _worker(self, stats, in_q, out_q, results_q, work):
+        while True:
+            job = in_q.get()
+            if job is _STOP:
+                return
+            item = job if isinstance(job, _Item) else _Item(*job)
+            if self._cancelled.is_set():
+                results_q.put(BatchResult(item.input_path, item.output_path,
+                                          False, "cancelled", 0.0, False))
+                continue
+
+            began = time.monotonic()
+            try:
+                done = work(item)
+            except Exception as e:
+                stats.add(time.monotonic() - began)
+                results_q.put(BatchResult(item.input_path, item.output_path,
+                                          False, str(e), 0.0, False))
+                continue
+            stats.add(time.monotonic() - began)
+
+            if done or out_q is None:
+                results_q.put(BatchResult(item.input_path, item.output_path, True, None,
+                                          time.monotonic() - item.start, item.hit))
+            else:
+                # Blocks while the next stage is full: this is the backpressure
+                out_q.put(item)
+
+    # Stage bodies return True when the item needs no further stages
+
+    def _decode(self, item):
+        with open(item.input_path, 'rb') as f:
+            item.data = f.read()
+        image = Image.open(io.BytesIO(item.data))
+
+        if self.tile_threshold and should_tile(image.size, self.tile_threshold):
+            # The tiled path does its own bounded decode/encode
+            item.tiled = True
+            item.data = None
+            return False
+
+        if self.cache is not None:
+            item.key, item.output = lookup(self.cache, item.data, image, self.model,
+                                           self.fast_mask)
+            if item.output is not None:
+                item.hit = True
+                item.data = None
+                return False
+
+        image.load()
+        item.image = image
+        item.data = None
+        return False
+
+    def _infer(self, item):
+        if item.tiled:
+            remove_background_tiled(item.input_path, item.output_path, model=self.model,
+                                    fmt=output_format(item.output_path))
+            return True
+        if item.output is None:
+            item.output = run_model(item.image, self.model, self.fast_mask)
+        item.image = None
+        return False
+
+    def _encode(self, item):
+        save_output(item.output, item.output_path)
+        if item.key is not None and not item.hit:
+            self.cache.put_mask(item.key, item.output.getchannel('A'))
+        item.output = None
+        return True
@@ -0,0 +1,95 @@
+"""Preview proxies.
+
+Previews are built from a reduced-size decode of the file instead of the
+full-resolution image. For JPEGs ``Image.draft`` lets libjpeg decode at
+1/2, 1/4 or 1/8 scale, which is where most of the time goes on large
+photos. The full-resolution source is never touched here.
+
+``render_preview`` prepares a display-sized RGBA frame with transparency
+shown as a checkerboard, for toolkits that upload raw pixels (Kivy).
+"""
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageOps
+
+PREVIEW_SIZE = (400, 300)
+
+CHECKER_CELL = 8
+CHECKER_COLORS = (204, 153)
+
+
+def load_preview(path, size=PREVIEW_SIZE):
+    """Decode a small proxy of the image file at ``path``"""
+    with Image.open(path) as image:
+        # draft() keeps the decoded size >= the requested one; ask for 2x so
+        # the final LANCZOS pass still has detail to work with
+        image.draft('RGB', (size[0] * 2, size[1] * 2))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        return image
+
+
+def make_preview(image, size=PREVIEW_SIZE):
+    """Thumbnail copy of an in-memory image; ``image`` is left untouched"""
+    preview = image.copy()
+    preview.thumbnail(size, Image.Resampling.LANCZOS)
+    return preview
+
+
+def fit_size(size, box):
+    """Largest size with ``size``'s aspect ratio inside ``box``, never enlarged"""
+    width, height = size
+    scale = min(1.0, box[0] / width, box[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def checkerboard(size, cell=CHECKER_CELL, colors=CHECKER_COLORS):
+    """Opaque gray RGBA checkerboard of ``size`` (width, height)"""
+    width, height = size
+    rows = (np.arange(height) // cell)[:, None]
+    cols = (np.arange(width) // cell)[None, :]
+    gray = np.where((rows + cols) % 2, colors[1], colors[0]).astype(np.uint8)
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    rgba[..., :3] = gray[..., None]
+    rgba[..., 3] = 255
+    return Image.fromarray(rgba)
+
+
+def render_preview(image, box):
+    """RGBA frame of ``image`` fitted into ``box``, transparency on a checkerboard.
+
+    Only the downscaled copy is converted and composited, so the work and
+    memory depend on ``box`` rather than on the photo size.
+    """
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    size = fit_size(image.size, box)
+    frame = image if size == image.size else image.resize(
+        size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    if frame.mode in ('RGBA', 'LA'):
+        return Image.alpha_composite(checkerboard(size), frame.convert('RGBA'))
+    return frame.convert('RGBA')
+
+
+class PreviewCache:
+    """Small LRU of ready-to-display objects (e.g. ImageTk.PhotoImage)"""
+
+    def __init__(self, max_items=8):
+        self.max_items = max_items
+        self._items = OrderedDict()
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+        return item
+
+    def put(self, key, item):
+        self._items[key] = item
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
@@ -0,0 +1,482 @@
+"""Local HTTP background-removal service.
+
+    python -m bgremover.server --port 8080 --workers 2 --model u2net --model isnet
+    curl --data-binary @photo.jpg "http://127.0.0.1:8080/remove?format=webp" -o cutout.webp
+
+Routes:
+
+- ``POST /remove``: image bytes in, cut-out out. Query parameters:
+  ``format`` (png or webp), ``model`` and ``fast_mask=1``;
+- ``POST /mask``: image bytes in, only the alpha mask out (grayscale PNG),
+  for clients that composite locally;
+- ``GET /metrics``: Prometheus text with request and inference latency
+  histograms, queue depth and request counters;
+- ``GET /health``.
+
+Connections are handled by asyncio; inference runs in a process pool whose
+workers all start and load their models before the server listens, and
+keep them warm in the session pool (and share the on-disk result cache).
+At most ``workers`` requests run and ``queue_size`` more upload or wait
+for a worker. Anything beyond that gets a 429 with ``Retry-After`` as soon
+as its headers are read, before the body is uploaded, so a burst cannot
+pile up in memory.
+
+Only the standard library is used and the server binds to 127.0.0.1 unless
+told otherwise; ``--port 0`` picks a free port, which is printed.
+"""
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from .batch import default_worker_count, save_output, threads_per_worker
+from .cache import get_cache, remove_cached
+from .sessions import AVAILABLE_MODELS, DEFAULT_MODEL, get_session, resolve_model_name
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_MAX_BODY_MB = 50
+# Longest a worker may take to load its models (first use downloads them)
+WARMUP_TIMEOUT = 600
+
+ROUTES = ("/remove", "/mask", "/metrics", "/health")
+OUTPUT_FORMATS = {"png": ("PNG", "image/png"), "webp": ("WEBP", "image/webp")}
+
+# Seconds
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REASONS = {
+    100: "Continue",
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or REASONS[status])
+        self.status = status
+
+
+# Worker processes
+
+_worker_cache = None
+_warmup = None
+
+
+def _init_worker(models, threads, use_cache, warmup):
+    global _worker_cache, _warmup
+    # rembg reads OMP_NUM_THREADS when it builds the ORT session options
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    _worker_cache = get_cache() if use_cache else None
+    _warmup = warmup
+    for model in models:
+        get_session(model)
+
+
+def _ready():
+    # Hold this worker until every worker has taken a warm-up job. The pool
+    # only starts processes while none is idle, so this makes it start
+    # (and initialise) all of them.
+    _warmup.wait(WARMUP_TIMEOUT)
+    return os.getpid()
+
+
+def _infer(route, data, model, fmt, fast_mask):
+    """Runs in a worker: returns (body, seconds, cache hit)"""
+    start = time.monotonic()
+    output, hit = remove_cached(data, model=model, cache=_worker_cache, fast_mask=fast_mask)
+    buffer = io.BytesIO()
+    if route == "/mask":
+        output.getchannel("A").save(buffer, "PNG")
+    else:
+        save_output(output, buffer, fmt=fmt)
+    return buffer.getvalue(), time.monotonic() - start, hit
+
+
+# Metrics
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def lines(self, name, labels):
+        prefix = "".join(f'{key}="{value}",' for key, value in labels.items())
+        suffix = f"{{{prefix.rstrip(',')}}}" if prefix else ""
+        for bound, count in zip(self.buckets, self.counts):
+            yield f'{name}_bucket{{{prefix}le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}'
+        yield f"{name}_sum{suffix} {self.sum:.6f}"
+        yield f"{name}_count{suffix} {self.count}"
+
+
+class Metrics:
+    """Counters and histograms, only touched from the event loop"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = {}  # (route, status) -> count
+        self.latency = {}  # route -> Histogram of whole request time
+        self.inference = {}  # model -> Histogram of worker time
+        self.queue_wait = Histogram()
+        self.cache_hits = 0
+
+    def record(self, route, status, seconds):
+        self.requests[(route, status)] = self.requests.get((route, status), 0) + 1
+        self.latency.setdefault(route, Histogram()).observe(seconds)
+
+    def record_inference(self, model, seconds, hit):
+        self.inference.setdefault(model, Histogram()).observe(seconds)
+        self.cache_hits += hit
+
+    def render(self, gauges):
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name, (value, text) in gauges.items():
+            header(name, "gauge", text)
+            lines.append(f"{name} {value}")
+
+        header("bgremover_requests_total", "counter", "Requests by route and status")
+        for (route, status), count in sorted(self.requests.items()):
+            lines.append(f'bgremover_requests_total{{route="{route}",status="{status}"}} {count}')
+        header("bgremover_cache_hits_total", "counter", "Requests answered from the result cache")
+        lines.append(f"bgremover_cache_hits_total {self.cache_hits}")
+
+        header("bgremover_request_seconds", "histogram", "Request latency, headers to response")
+        for route, histogram in sorted(self.latency.items()):
+            lines.extend(histogram.lines("bgremover_request_seconds", {"route": route}))
+        header("bgremover_inference_seconds", "histogram", "Time spent in a worker")
+        for model, histogram in sorted(self.inference.items()):
+            lines.extend(histogram.lines("bgremover_inference_seconds", {"model": model}))
+        header("bgremover_queue_wait_seconds", "histogram", "Time waiting for a free worker")
+        lines.extend(self.queue_wait.lines("bgremover_queue_wait_seconds", {}))
+        return "\n".join(lines) + "\n"
+
+
+# HTTP
+
+class Request:
+    __slots__ = ("method", "path", "query", "version", "headers", "body")
+
+    def __init__(self, method, path, query, version, headers):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.version = version
+        self.headers = headers
+        self.body = b""
+
+    def param(self, name, default=None):
+        return self.query.get(name, [default])[0]
+
+    def keep_alive(self):
+        """Whether the client wants the connection kept open (HTTP/1.0 must ask)"""
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+async def _readline(reader):
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        # Longer than the stream limit (64 KiB)
+        raise HTTPError(400, "Request line or header too long")
+
+
+async def read_head(reader):
+    """Request line and headers, or None once the client has closed"""
+    line = await _readline(reader)
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await _readline(reader)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    url = urlsplit(target)
+    return Request(method.upper(), url.path, parse_qs(url.query), version.upper(), headers)
+
+
+def encode_response(status, body=b"", content_type="text/plain; charset=utf-8",
+                    headers=None, keep_alive=True):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+             f"Content-Length: {len(body)}",
+             f"Content-Type: {content_type}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+class Server:
+    """The HTTP front end and its inference process pool"""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, models=(DEFAULT_MODEL,),
+                 workers=None, queue_size=None, use_cache=True,
+                 max_body_mb=DEFAULT_MAX_BODY_MB):
+        self.host = host
+        self.port = port
+        self.models = [resolve_model_name(model) for model in models] or [DEFAULT_MODEL]
+        self.default_model = self.models[0]
+        self.workers = max(1, workers or default_worker_count(len(self.models)))
+        self.queue_size = self.workers * 2 if queue_size is None else queue_size
+        self.use_cache = use_cache
+        self.max_body = int(max_body_mb * 1024 * 1024)
+        self.metrics = Metrics()
+        self.uploading = 0
+        self.queued = 0
+        self.running = 0
+        self._slots = None
+        self._pool = None
+        self._server = None
+
+    async def start(self):
+        """Start the workers (models loaded) and listen; returns the bound port"""
+        self._slots = asyncio.Semaphore(self.workers)
+        context = multiprocessing.get_context()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.models, threads_per_worker(self.workers), self.use_cache,
+                      context.Barrier(self.workers)),
+        )
+        # One job per worker, each held until all are taken, so every
+        # process loads its models before the first request arrives
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(loop.run_in_executor(self._pool, _ready)
+                                      for _ in range(self.workers)))
+        if len(set(pids)) != self.workers:
+            raise RuntimeError(f"Only {len(set(pids))} of {self.workers} workers started")
+
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def is_full(self):
+        return self.uploading + self.queued + self.running >= self.workers + self.queue_size
+
+    async def _handle(self, reader, writer):
+        try:
+            keep_alive = True
+            while keep_alive:
+                keep_alive = await self._handle_one(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_one(self, reader, writer):
+        """Serve one request; returns whether the connection stays open"""
+        try:
+            request = await read_head(reader)
+        except HTTPError as e:
+            writer.write(encode_response(e.status, f"{e}\n".encode(), keep_alive=False))
+            await writer.drain()
+            return False
+        if request is None:
+            return False
+
+        start = time.monotonic()
+        keep_alive = request.keep_alive()
+        headers = {}
+        try:
+            status, body, content_type, headers = await self._dispatch(request, reader, writer)
+        except HTTPError as e:
+            status, body, content_type = e.status, f"{e}\n".encode(), "text/plain; charset=utf-8"
+            if status == 429:
+                headers = {"Retry-After": "1"}
+            if status in (411, 413, 429) or (request.method == "POST" and not request.body):
+                # The body was not read, so the connection can't be reused
+                keep_alive = False
+        except Exception as e:
+            status, body, content_type = 500, f"{e}\n".encode(), "text/plain; charset=utf-8"
+        writer.write(encode_response(status, body, content_type, headers, keep_alive))
+        await writer.drain()
+        # Unknown paths share one label so scanners can't grow the metrics
+        route = request.path if request.path in ROUTES else "other"
+        self.metrics.record(route, status, time.monotonic() - start)
+        return keep_alive
+
+    async def _dispatch(self, request, reader, writer):
+        if request.path in ("/remove", "/mask"):
+            if request.method != "POST":
+                raise HTTPError(405)
+            return await self._remove(request, reader, writer)
+        if request.path == "/metrics":
+            return 200, self.render_metrics().encode(), "text/plain; version=0.0.4", {}
+        if request.path == "/health":
+            body = json.dumps({"status": "ok", "models": self.models,
+                               "workers": self.workers}).encode()
+            return 200, body, "application/json", {}
+        raise HTTPError(404)
+
+    async def _remove(self, request, reader, writer):
+        fmt = (request.param("format") or "png").lower()
+        if fmt not in OUTPUT_FORMATS:
+            raise HTTPError(400, f"Unknown format '{fmt}'. Choose png or webp")
+        try:
+            model = resolve_model_name(request.param("model") or self.default_model)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        fast_mask = request.param("fast_mask", "0") not in ("0", "false", "")
+
+        if "chunked" in request.headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411)
+        try:
+            length = int(request.headers["content-length"])
+        except (KeyError, ValueError):
+            raise HTTPError(411)
+        if length > self.max_body:
+            raise HTTPError(413, f"Images are limited to {self.max_body // (1024 * 1024)} MB")
+        # Backpressure: refuse before the client uploads the body, and hold
+        # a slot while it does so concurrent uploads can't overshoot
+        if self.is_full():
+            raise HTTPError(429, "Server busy, retry later")
+        self.uploading += 1
+        try:
+            if request.headers.get("expect", "").lower() == "100-continue":
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await writer.drain()
+            request.body = await reader.readexactly(length)
+        finally:
+            self.uploading -= 1
+        if not request.body:
+            raise HTTPError(400, "Empty body")
+
+        pil_format, content_type = OUTPUT_FORMATS[fmt]
+        loop = asyncio.get_running_loop()
+        self.queued += 1
+        enqueued = time.monotonic()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.metrics.queue_wait.observe(time.monotonic() - enqueued)
+        self.running += 1
+        try:
+            body, seconds, hit = await loop.run_in_executor(
+                self._pool, _infer, request.path, request.body, model, pil_format, fast_mask)
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+        self.metrics.record_inference(model, seconds, hit)
+        if request.path == "/mask":
+            content_type = "image/png"
+        return 200, body, content_type, {
+            "X-Cache": "hit" if hit else "miss",
+            "X-Inference-Seconds": f"{seconds:.3f}",
+        }
+
+    def render_metrics(self):
+        return self.metrics.render({
+            "bgremover_uploading": (self.uploading, "Requests whose body is being received"),
+            "bgremover_queue_depth": (self.queued, "Requests waiting for a worker"),
+            "bgremover_inflight": (self.running, "Requests being processed"),
+            "bgremover_workers": (self.workers, "Worker processes"),
+            "bgremover_queue_capacity": (self.queue_size, "Requests that may wait"),
+            "bgremover_uptime_seconds": (round(time.time() - self.metrics.started, 1),
+                                         "Seconds since start"),
+        })
+
+
+async def serve(server, ready=None):
+    port = await server.start()
+    if ready is not None:
+        ready(port)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m bgremover.server",
+                                     description="Serve background removal over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="interface to bind (default: %(default)s, local only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="port to listen on, 0 for any free port (default: %(default)s)")
+    parser.add_argument("-m", "--model", action="append", choices=AVAILABLE_MODELS,
+                        help=f"model to keep warm, repeatable; the first is the default "
+                             f"(default: {DEFAULT_MODEL})")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help=f"worker processes (default: {default_worker_count()})")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="requests that may wait for a worker before 429s "
+                             "(default: twice the workers)")
+    parser.add_argument("--max-body-mb", type=float, default=DEFAULT_MAX_BODY_MB,
+                        help="largest accepted upload (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always run the model, ignoring the result cache")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    server = Server(host=args.host, port=args.port, models=args.model or [DEFAULT_MODEL],
+                    workers=args.workers, queue_size=args.queue_size,
+                    use_cache=not args.no_cache, max_body_mb=args.max_body_mb)
+
+    def ready(port):
+        print(f"Serving on http://{args.host}:{port} "
+              f"({server.workers} workers, models: {', '.join(server.models)})",
+              file=sys.stderr, flush=True)
+
+    try:
+        asyncio.run(serve(server, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Shared rembg session pool.
+
+Every entry point goes through this module instead of calling
+``rembg.remove()`` without a session, so each ONNX model is resolved and
+loaded once per process and then kept warm between calls.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MODEL = "u2net"
+
+# Names accepted by the apps -> model names understood by rembg
+MODEL_ALIASES = {
+    "u2net": "u2net",
+    "u2netp": "u2netp",
+    "isnet": "isnet-general-use",
+    "isnet-general-use": "isnet-general-use",
+    "silueta": "silueta",
+}
+
+# Models offered in the UIs (friendly names)
+AVAILABLE_MODELS = ("u2net", "u2netp", "isnet", "silueta")
+
+# Rough resident size of a loaded session in MB (weights + ORT arena)
+MODEL_MEMORY_MB = {
+    "u2net": 350,
+    "u2netp": 30,
+    "isnet-general-use": 360,
+    "silueta": 90,
+}
+
+DEFAULT_MEMORY_CAP_MB = int(os.environ.get("BGREMOVER_SESSION_CAP_MB", "1024"))
+
+# Sessions unused for this long are dropped by evict_idle_sessions()
+IDLE_EVICT_SECONDS = int(os.environ.get("BGREMOVER_SESSION_IDLE_SECONDS", "600"))
+# How often the apps call it
+IDLE_CHECK_SECONDS = 60
+
+
+def resolve_model_name(model):
+    """Map a friendly model name to the rembg model name"""
+    name = (model or DEFAULT_MODEL).strip().lower()
+    if name not in MODEL_ALIASES:
+        raise ValueError(
+            f"Unknown model '{model}'. Choose one of: {', '.join(AVAILABLE_MODELS)}"
+        )
+    return MODEL_ALIASES[name]
+
+
+class SessionPool:
+    """Keeps rembg sessions warm and evicts the least recently used ones
+    once the estimated memory use goes over ``memory_cap_mb``."""
+
+    def __init__(self, memory_cap_mb=DEFAULT_MEMORY_CAP_MB, session_factory=None):
+        self.memory_cap_mb = memory_cap_mb
+        self._session_factory = session_factory or _new_rembg_session
+        self._sessions = OrderedDict()  # model name -> [session, last_used]
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, model=DEFAULT_MODEL):
+        """Return a warm session for ``model``, loading it on first use"""
+        name = resolve_model_name(model)
+
+        session = self._lookup(name)
+        if session is not None:
+            return session
+
+        # One loader per model; other callers wait instead of loading twice
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            session = self._lookup(name)
+            if session is not None:
+                return session
+
+            session = self._session_factory(name)
+            with self._lock:
+                self._sessions[name] = [session, time.monotonic()]
+                evicted = self._evict_over_cap(keep=name)
+            _release(evicted)
+            return session
+
+    def _lookup(self, name):
+        with self._lock:
+            entry = self._sessions.get(name)
+            if entry is None:
+                return None
+            entry[1] = time.monotonic()
+            self._sessions.move_to_end(name)
+            return entry[0]
+
+    def _evict_over_cap(self, keep):
+        # Caller holds self._lock; returns the evicted sessions
+        evicted = []
+        for name in list(self._sessions):
+            if self._memory_used_mb() <= self.memory_cap_mb:
+                break
+            if name != keep:
+                evicted.append(self._sessions.pop(name)[0])
+        return evicted
+
+    def _memory_used_mb(self):
+        return sum(MODEL_MEMORY_MB.get(name, 200) for name in self._sessions)
+
+    def evict_idle(self, max_idle_seconds):
+        """Drop sessions that have not been used for ``max_idle_seconds``"""
+        cutoff = time.monotonic() - max_idle_seconds
+        evicted = []
+        with self._lock:
+            for name, (_, last_used) in list(self._sessions.items()):
+                if last_used < cutoff:
+                    evicted.append(self._sessions.pop(name)[0])
+        _release(evicted)
+
+    def loaded_models(self):
+        with self._lock:
+            return list(self._sessions)
+
+    def memory_used_mb(self):
+        with self._lock:
+            return self._memory_used_mb()
+
+    def clear(self):
+        with self._lock:
+            evicted = [session for session, _ in self._sessions.values()]
+            self._sessions.clear()
+        _release(evicted)
+
+
+def _release(sessions):
+    # A micro-batched session's scheduler thread keeps it alive until stopped
+    if not sessions:
+        return
+    from .microbatch import close_batching
+
+    for session in sessions:
+        close_batching(session)
+
+
+def _new_rembg_session(model_name):
+    # Session options and weights (fp32/int8) follow the ONNX Runtime config
+    from .microbatch import batched_session, get_settings
+    from .onnx_tuning import new_tuned_session
+
+    max_batch, max_wait_ms = get_settings()
+    if max_batch > 1:
+        return batched_session(model_name, max_batch, max_wait_ms)
+    return new_tuned_session(model_name)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide session pool"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SessionPool()
+        return _default_pool
+
+
+def evict_idle_sessions(max_idle_seconds=IDLE_EVICT_SECONDS):
+    """Free the models of the process-wide pool that have sat unused; the
+    apps call this every IDLE_CHECK_SECONDS from their UI timers"""
+    get_pool().evict_idle(max_idle_seconds)
+
+
+def get_session(model=DEFAULT_MODEL):
+    return get_pool().get(model)
+
+
+def remove_background(image, model=DEFAULT_MODEL, **kwargs):
+    """Drop-in replacement for ``rembg.remove`` that reuses a warm session"""
+    from rembg import remove
+    return remove(image, session=get_session(model), **kwargs)
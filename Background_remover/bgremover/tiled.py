@@ -0,0 +1,245 @@
+"""Tiled, memory-bounded processing for very large images.
+
+The mask is computed once at model resolution from a reduced-size decode.
+The source is then decoded once and walked in horizontal strips of the
+upright image (EXIF rotation and mode conversion are applied per strip,
+never to a full-size copy). Each strip gets its alpha from the upsampled
+guided-filter coefficients (see fastmask.py) and is:
+
+- composed into RGBA and written straight into a streaming PNG encoder;
+- for JPEG, flattened onto white and written back over the source pixels
+  it was read from, and the source is encoded once at the end;
+- for WebP, its alpha goes into a one-byte-per-pixel plane that is
+  attached to the source before the single encode.
+
+Apart from the decoded source pixels (plus that alpha plane for WebP),
+memory use depends on the strip height, not on the image size; the full
+RGBA result and full-size float arrays never exist. JPEG and WebP outputs
+keep the source's pixel orientation and carry its EXIF orientation tag.
+"""
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from .fastmask import FAST_MASK_MAX_SIDE, guided_coefficients, luminance, predict_small_mask
+from .sessions import DEFAULT_MODEL
+
+TILED_PIXEL_THRESHOLD = int(os.environ.get("BGREMOVER_TILED_PIXELS", "50000000"))
+STRIP_ROWS = 256
+
+_EXIF_ORIENTATION = 0x0112
+
+
+def should_tile(size, threshold=TILED_PIXEL_THRESHOLD):
+    """True when an image of ``size`` (width, height) should be tiled"""
+    return size[0] * size[1] > threshold
+
+
+class PNGStreamWriter:
+    """Writes an 8-bit RGBA PNG row block by row block"""
+
+    def __init__(self, f, width, height, level=6):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(level)
+
+        f.write(b'\x89PNG\r\n\x1a\n')
+        # bit depth 8, colour type 6 (RGBA), deflate, adaptive filtering, no interlace
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.f.write(struct.pack('>I', len(data)))
+        self.f.write(kind)
+        self.f.write(data)
+        self.f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff))
+
+    def write_rows(self, rgba):
+        """Append a (rows, width, 4) uint8 block"""
+        rows = rgba.reshape(rgba.shape[0], -1)
+        # PNG "Sub" filter: each byte minus the byte one pixel to the left
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:5] = rows[:, :4]
+        filtered[:, 5:] = rows[:, 4:] - rows[:, :-4]
+
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+        self.rows_written += rows.shape[0]
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"expected {self.height} rows, got {self.rows_written}")
+        self._chunk(b'IDAT', self._compressor.flush())
+        self._chunk(b'IEND', b'')
+
+
+def _open_proxy(input_path, max_side):
+    """Reduced-size decode used for inference"""
+    with Image.open(input_path) as image:
+        image.draft('RGB', (max_side, max_side))
+        return ImageOps.exif_transpose(image).convert('RGB')
+
+
+# EXIF orientation -> transpose that turns the stored pixels upright
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+# ...and the one that turns upright pixels back into stored ones
+_INVERSE_TRANSPOSE = {
+    Image.Transpose.ROTATE_90: Image.Transpose.ROTATE_270,
+    Image.Transpose.ROTATE_270: Image.Transpose.ROTATE_90,
+}
+
+
+def _source_box(orientation, source_size, top, bottom):
+    """Box of the stored image holding rows ``top:bottom`` of the upright image"""
+    width, height = source_size
+    if orientation in (1, 2):
+        return (0, top, width, bottom)
+    if orientation in (3, 4):
+        return (0, height - bottom, width, height - top)
+    if orientation in (5, 6):
+        # Upright rows are stored columns, left to right
+        return (top, 0, bottom, height)
+    # 7, 8: upright rows are stored columns, right to left
+    return (width - bottom, 0, width - top, height)
+
+
+class _StripSource:
+    """Upright strips of a decoded image, without a transposed or converted
+    full-size copy; composited strips can be written back in place"""
+
+    def __init__(self, image):
+        self.image = image
+        self.orientation = image.getexif().get(_EXIF_ORIENTATION, 1)
+        self.transpose = _ORIENTATION_TRANSPOSE.get(self.orientation)
+        width, height = image.size
+        self.size = (height, width) if self.orientation in (5, 6, 7, 8) else (width, height)
+
+    def _box(self, top, bottom):
+        return _source_box(self.orientation, self.image.size, top, bottom)
+
+    def read(self, top, bottom):
+        """Upright RGB strip of rows ``top:bottom``"""
+        strip = self.image.crop(self._box(top, bottom))
+        if self.transpose is not None:
+            strip = strip.transpose(self.transpose)
+        return strip if strip.mode == 'RGB' else strip.convert('RGB')
+
+    def write(self, target, top, bottom, strip):
+        """Paste the upright ``strip`` into ``target`` (stored orientation)"""
+        if self.transpose is not None:
+            strip = strip.transpose(_INVERSE_TRANSPOSE.get(self.transpose, self.transpose))
+        box = self._box(top, bottom)
+        target.paste(strip if strip.mode == target.mode else strip.convert(target.mode), box[:2])
+
+    def exif(self):
+        """EXIF carrying the original orientation, for outputs written in
+        stored orientation"""
+        exif = Image.Exif()
+        if self.orientation != 1:
+            exif[_EXIF_ORIENTATION] = self.orientation
+        return exif
+
+
+def _alpha_strips(source, small_image, small_mask, strip_rows):
+    """Yield ``(top, bottom, strip, alpha)`` down the upright image"""
+    a, b = guided_coefficients(
+        luminance(small_image),
+        np.asarray(small_mask, dtype=np.float32) / 255.0,
+    )
+    a_image = Image.fromarray(np.ascontiguousarray(a, dtype=np.float32))
+    b_image = Image.fromarray(np.ascontiguousarray(b, dtype=np.float32))
+    width, height = source.size
+    scale_y = small_image.height / height
+
+    for top in range(0, height, strip_rows):
+        bottom = min(height, top + strip_rows)
+        strip = source.read(top, bottom)
+
+        # Upsample only the part of the coefficient maps under this strip
+        box = (0, top * scale_y, small_image.width, bottom * scale_y)
+        strip_size = (width, bottom - top)
+        alpha = np.asarray(a_image.resize(strip_size, Image.Resampling.BILINEAR, box=box))
+        alpha = alpha * luminance(strip)
+        alpha += np.asarray(b_image.resize(strip_size, Image.Resampling.BILINEAR, box=box))
+        np.clip(alpha, 0.0, 1.0, out=alpha)
+        yield top, bottom, strip, (alpha * 255.0 + 0.5).astype(np.uint8)
+
+
+def _write_png(f, source, strips):
+    writer = PNGStreamWriter(f, *source.size)
+    for top, bottom, strip, alpha in strips:
+        rgba = np.empty((bottom - top, source.size[0], 4), dtype=np.uint8)
+        rgba[..., :3] = np.asarray(strip)
+        rgba[..., 3] = alpha
+        writer.write_rows(rgba)
+    writer.close()
+
+
+def _write_jpeg(f, source, strips, quality):
+    # Flatten each strip onto white and write it back over the source
+    # pixels it came from, then encode the whole image once
+    image = source.image
+    if image.mode not in ('RGB', 'L'):
+        image = source.image = image.convert('RGB')
+    for top, bottom, strip, alpha in strips:
+        weight = alpha[..., None].astype(np.float32) / 255.0
+        flat = np.asarray(strip, dtype=np.float32) * weight + 255.0 * (1.0 - weight)
+        source.write(image, top, bottom, Image.fromarray((flat + 0.5).astype(np.uint8)))
+    image.save(f, 'JPEG', quality=quality, exif=source.exif())
+
+
+def _write_webp(f, source, strips, quality):
+    # Only the alpha plane (one byte per pixel) is allocated next to the source
+    image = source.image
+    if image.mode != 'RGB':
+        image = source.image = image.convert('RGB')
+    alpha_plane = Image.new('L', image.size)
+    for top, bottom, strip, alpha in strips:
+        source.write(alpha_plane, top, bottom, Image.fromarray(alpha))
+    image.putalpha(alpha_plane)
+    image.save(f, 'WEBP', quality=quality, exif=source.exif())
+
+
+def remove_background_tiled(input_path, output_path, model=DEFAULT_MODEL, fmt='PNG',
+                            strip_rows=STRIP_ROWS, max_side=FAST_MASK_MAX_SIDE, quality=95):
+    """Remove the background of ``input_path`` and write ``fmt`` (PNG, JPEG
+    or WEBP) to ``output_path``"""
+    small_image, small_mask = predict_small_mask(_open_proxy(input_path, max_side), model, max_side)
+
+    image = Image.open(input_path)
+    # Write next to the target and rename, so a crash never leaves half a file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)),
+                                    suffix=".tmp")
+    try:
+        image.load()
+        source = _StripSource(image)
+        strips = _alpha_strips(source, small_image, small_mask, strip_rows)
+        with os.fdopen(fd, 'wb') as f:
+            if fmt == 'JPEG':
+                _write_jpeg(f, source, strips, quality)
+            elif fmt == 'WEBP':
+                _write_webp(f, source, strips, quality)
+            else:
+                _write_png(f, source, strips)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        image.close()
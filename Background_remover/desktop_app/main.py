@@ -1,12 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
-from PIL import Image, ImageTk
-from rembg import remove
+from PIL import ImageTk
 import os
 import threading
 import sys
 
+# Shared core lives one level up (Background_remover/bgremover), the Tk
+# helpers shared with the other apps two levels up (shared/)
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(_APP_DIR)))
+sys.path.insert(0, os.path.dirname(_APP_DIR))
+from bgremover.batch import BatchEngine, batch_jobs
+from bgremover.cache import get_cache, remove_cached
+from bgremover.preview import PreviewCache, load_preview, make_preview
+from bgremover.sessions import (AVAILABLE_MODELS, DEFAULT_MODEL, IDLE_CHECK_SECONDS,
+                                evict_idle_sessions)
+from shared.ui_bus import UIBus, format_eta
+
 class BackgroundRemoverApp:
     def __init__(self, root):
         self.root = root
@@ -17,8 +28,10 @@ class BackgroundRemoverApp:
         # Variables
         self.input_path = None
         self.output_path = None
-        self.original_image = None
         self.processed_image = None
+        self.preview_cache = PreviewCache()
+        self.model_var = tk.StringVar(value=DEFAULT_MODEL)
+        self.fast_mask_var = tk.BooleanVar(value=False)
         
         # Configure styles
         self.setup_styles()
@@ -26,6 +39,20 @@ class BackgroundRemoverApp:
         # Create UI
         self.create_widgets()
         
+        # Worker threads report through the bus; the Tk loop applies the
+        # updates at a fixed frame rate
+        self.bus = UIBus(self.root)
+        self.bus.on_progress(self._on_batch_progress)
+        self.bus.start()
+        self.batch_failed = self.batch_hits = 0
+        
+        # Free models that haven't been used for a while
+        self.root.after(IDLE_CHECK_SECONDS * 1000, self._evict_idle_sessions)
+        
+    def _evict_idle_sessions(self):
+        evict_idle_sessions()
+        self.root.after(IDLE_CHECK_SECONDS * 1000, self._evict_idle_sessions)
+        
     def setup_styles(self):
         self.style = ttk.Style()
         self.style.theme_use('clam')
@@ -124,6 +151,26 @@ class BackgroundRemoverApp:
         )
         self.batch_btn.pack(side=tk.LEFT)
         
+        # Model selection
+        model_frame = ttk.Frame(right_panel)
+        model_frame.pack(fill=tk.X)
+        
+        ttk.Label(model_frame, text="Model:").pack(side=tk.LEFT, padx=(0, 5))
+        self.model_combo = ttk.Combobox(
+            model_frame,
+            textvariable=self.model_var,
+            values=AVAILABLE_MODELS,
+            state='readonly',
+            width=12
+        )
+        self.model_combo.pack(side=tk.LEFT)
+        
+        ttk.Checkbutton(
+            model_frame,
+            text="Fast mask (large photos)",
+            variable=self.fast_mask_var
+        ).pack(side=tk.LEFT, padx=(10, 0))
+        
         # Progress bar
         self.progress = ttk.Progressbar(
             right_panel,
@@ -165,8 +212,14 @@ class BackgroundRemoverApp:
     
     def load_image(self, file_path):
         try:
+            # Only a reduced-size proxy is decoded here; the full-resolution
+            # pixels are read when processing starts
+            key = (file_path, os.path.getmtime(file_path))
+            photo = self.preview_cache.get(key)
+            if photo is None:
+                photo = ImageTk.PhotoImage(load_preview(file_path))
+                self.preview_cache.put(key, photo)
             self.input_path = file_path
-            self.original_image = Image.open(file_path)
             
             # Update file info
             file_name = os.path.basename(file_path)
@@ -177,7 +230,7 @@ class BackgroundRemoverApp:
             )
             
             # Show thumbnail
-            self.show_preview(self.original_image)
+            self.display_photo(photo)
             
             # Enable process button
             self.process_btn.config(state=tk.NORMAL)
@@ -187,18 +240,16 @@ class BackgroundRemoverApp:
             messagebox.showerror("Error", f"Failed to load image: {str(e)}")
     
     def show_preview(self, image):
-        # Resize for preview
-        preview_size = (400, 300)
-        image.thumbnail(preview_size, Image.Resampling.LANCZOS)
-        
-        # Convert for Tkinter
-        photo = ImageTk.PhotoImage(image)
-        
+        # Resize a copy for preview so the full-size image stays intact
+        photo = ImageTk.PhotoImage(make_preview(image))
+        self.display_photo(photo)
+    
+    def display_photo(self, photo):
         self.preview_label.config(image=photo)
         self.preview_label.image = photo  # Keep reference
     
     def process_image(self):
-        if not self.original_image:
+        if not self.input_path:
             messagebox.showwarning("Warning", "Please select an image first!")
             return
         
@@ -207,25 +258,34 @@ class BackgroundRemoverApp:
         self.progress.start()
         self.status_bar.config(text="Processing... Please wait.")
         
-        threading.Thread(target=self._process_background, daemon=True).start()
+        threading.Thread(target=self._process_background,
+                         args=(self.input_path, self.model_var.get(), self.fast_mask_var.get()),
+                         daemon=True).start()
     
-    def _process_background(self):
+    def _process_background(self, input_path, model, fast_mask):
         try:
-            # Remove background
-            output = remove(self.original_image)
-            self.processed_image = output
+            # Remove background (cache hits skip inference entirely)
+            with open(input_path, 'rb') as f:
+                data = f.read()
+            output, hit = remove_cached(data, model=model, cache=get_cache(),
+                                        fast_mask=fast_mask)
             
             # Update UI in main thread
-            self.root.after(0, self._on_processing_complete, output)
+            self.bus.call(self._on_processing_complete, output, hit)
             
         except Exception as e:
-            self.root.after(0, self._on_processing_error, str(e))
+            self.bus.call(self._on_processing_error, str(e))
     
-    def _on_processing_complete(self, output_image):
+    def _on_processing_complete(self, output_image, cache_hit=False):
+        self.processed_image = output_image
         self.progress.stop()
         self.show_preview(output_image)
         self.save_btn.config(state=tk.NORMAL)
-        self.status_bar.config(text="Background removed successfully!")
+        self.process_btn.config(state=tk.NORMAL)
+        source = "cached result" if cache_hit else "model"
+        self.status_bar.config(
+            text=f"Background removed successfully! ({source}, {get_cache().stats_text()})"
+        )
         messagebox.showinfo("Success", "Background removed successfully!")
     
     def _on_processing_error(self, error_msg):
@@ -273,29 +333,65 @@ class BackgroundRemoverApp:
             output_dir = os.path.join(directory, "background_removed")
             os.makedirs(output_dir, exist_ok=True)
             
-            # Process all images
-            extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
-            for file in os.listdir(directory):
-                if file.lower().endswith(extensions):
-                    try:
-                        input_path = os.path.join(directory, file)
-                        output_path = os.path.join(output_dir, f"no_bg_{file}")
-                        
-                        input_img = Image.open(input_path)
-                        output_img = remove(input_img)
-                        
-                        if file.lower().endswith(('.jpg', '.jpeg')):
-                            output_img.save(output_path, 'JPEG', quality=95)
-                        else:
-                            output_img.save(output_path, 'PNG')
-                            
-                    except Exception as e:
-                        print(f"Failed to process {file}: {e}")
+            jobs = batch_jobs(directory, output_dir)
+            if not jobs:
+                messagebox.showinfo("Batch Process", "No images found in the selected folder.")
+                return
+            
+            self.batch_btn.config(state=tk.DISABLED)
+            self.progress.config(mode='determinate', maximum=len(jobs), value=0)
+            self.status_bar.config(text=f"Batch processing {len(jobs)} images...")
+            self.batch_failed = self.batch_hits = 0
+            self.bus.start_job(len(jobs))
             
-            messagebox.showinfo("Batch Complete", 
-                              f"Batch processing completed!\nImages saved in: {output_dir}")
+            # Run the engine off the Tk main thread
+            engine = BatchEngine(model=self.model_var.get(),
+                                 fast_mask=self.fast_mask_var.get())
+            threading.Thread(target=self._batch_background,
+                             args=(engine, jobs, output_dir), daemon=True).start()
+    
+    def _batch_background(self, engine, jobs, output_dir):
+        done = failed = hits = 0
+        for result in engine.run(jobs):
+            done += 1
+            hits += result.cached
+            if not result.ok:
+                failed += 1
+                print(f"Failed to process {os.path.basename(result.input_path)}: {result.error}")
+            
+            # Coalesced by the bus: at most one status update per frame
+            self.bus.set("batch_counts", self._set_batch_counts, failed, hits)
+            self.bus.progress(done)
+        
+        if engine.stage_stats:
+            busy = ", ".join(f"{name} {stats['utilisation']:.0%}"
+                             for name, stats in engine.stage_stats.items())
+            print(f"Batch stage utilisation: {busy}")
+        self.bus.call(self._on_batch_complete, done - failed, failed, hits, output_dir)
+    
+    def _set_batch_counts(self, failed, hits):
+        self.batch_failed, self.batch_hits = failed, hits
+    
+    def _on_batch_progress(self, done, total, rate, eta):
+        self.progress.config(value=done)
+        misses = done - self.batch_failed - self.batch_hits
+        self.status_bar.config(
+            text=f"Batch: {done}/{total} done ({self.batch_failed} failed, "
+                 f"cache: {self.batch_hits} hits / {misses} misses) | "
+                 f"{rate:.1f} images/s | ETA {format_eta(eta)}"
+        )
+    
+    def _on_batch_complete(self, processed, failed, hits, output_dir):
+        self.progress.config(mode='indeterminate', value=0)
+        self.batch_btn.config(state=tk.NORMAL)
+        self.status_bar.config(
+            text=f"Batch complete: {processed} processed, {failed} failed, "
+                 f"cache: {hits} hits / {processed - hits} misses."
+        )
+        messagebox.showinfo("Batch Complete", 
+                          f"Batch processing completed!\nImages saved in: {output_dir}")
 
-def cli_mode():
+def cli_mode(model=DEFAULT_MODEL):
     """Simple CLI mode for headless environments"""
     print("\n🎨 Background Remover Pro - CLI Mode")
     print("=" * 50)
@@ -313,12 +409,12 @@ def cli_mode():
             if os.path.exists(file_path):
                 try:
                     print("Processing image...")
-                    img = Image.open(file_path)
-                    output = remove(img)
+                    with open(file_path, 'rb') as f:
+                        output, hit = remove_cached(f.read(), model=model, cache=get_cache())
                     
                     output_path = file_path.rsplit('.', 1)[0] + '_no_bg.png'
                     output.save(output_path, 'PNG')
-                    print(f"✓ Image saved to: {output_path}")
+                    print(f"✓ Image saved to: {output_path}" + (" (cached)" if hit else ""))
                 except Exception as e:
                     print(f"✗ Error: {e}")
             else:
@@ -331,29 +427,20 @@ def cli_mode():
                     output_dir = os.path.join(directory, "background_removed")
                     os.makedirs(output_dir, exist_ok=True)
                     
-                    extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
                     processed = 0
+                    hits = 0
                     
-                    for file in os.listdir(directory):
-                        if file.lower().endswith(extensions):
-                            try:
-                                input_path = os.path.join(directory, file)
-                                output_path = os.path.join(output_dir, f"no_bg_{file}")
-                                
-                                img = Image.open(input_path)
-                                output = remove(img)
-                                
-                                if file.lower().endswith(('.jpg', '.jpeg')):
-                                    output.save(output_path, 'JPEG', quality=95)
-                                else:
-                                    output.save(output_path, 'PNG')
-                                
-                                processed += 1
-                                print(f"✓ {file}")
-                            except Exception as e:
-                                print(f"✗ {file}: {e}")
+                    for result in BatchEngine(model=model).run(batch_jobs(directory, output_dir)):
+                        file = os.path.basename(result.input_path)
+                        if result.ok:
+                            processed += 1
+                            hits += result.cached
+                            print(f"✓ {file}")
+                        else:
+                            print(f"✗ {file}: {result.error}")
                     
                     print(f"\n✓ Batch complete! {processed} images processed.")
+                    print(f"  Cache: {hits} hits / {processed - hits} misses")
                     print(f"  Output: {output_dir}")
                 except Exception as e:
                     print(f"✗ Error: {e}")
@@ -7,17 +7,27 @@ from kivy.uix.popup import Popup
 from kivy.uix.progressbar import ProgressBar
 from kivy.uix.filechooser import FileChooserListView
 from kivy.core.window import Window
-from kivy.graphics.texture import Texture
 from kivy.clock import Clock
 from kivy.lang import Builder
 from kivy.utils import platform
 
-from rembg import remove
 from PIL import Image as PILImage
 import io
 import os
+import sys
 import threading
 
+# The shared core is installed (pip install -e ..) or vendored next to this
+# file for buildozer, which only packages this directory (see
+# vendor_bgremover.py); from the source tree it lives one level up
+try:
+    import bgremover
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bgremover.mask_backends import create_remover
+from bgremover.sessions import IDLE_CHECK_SECONDS, evict_idle_sessions
+from texture_preview import TexturePreview
+
 # UI Layout
 Builder.load_string('''
 <BackgroundRemoverMobile>:
@@ -102,6 +112,11 @@ class BackgroundRemoverMobile(BoxLayout):
         self.input_image = None
         self.processed_image = None
         self.input_path = None
+        # Remote worker (BGREMOVER_WORKER_URL) when reachable, u2netp on the phone otherwise
+        self.remover = create_remover()
+        self.preview = TexturePreview(self.ids.preview_image)
+        # Free the on-device model once it has sat unused for a while
+        Clock.schedule_interval(lambda dt: evict_idle_sessions(), IDLE_CHECK_SECONDS)
         
         # Set window size for mobile emulation
         if platform == 'android' or platform == 'ios':
@@ -145,8 +160,8 @@ class BackgroundRemoverMobile(BoxLayout):
         try:
             self.input_image = PILImage.open(file_path)
             
-            # Display preview
-            self.display_preview(self.input_image)
+            # Display preview (decoded separately, at screen size)
+            self.preview.show_file(file_path)
             
             # Enable process button
             self.ids.process_btn.disabled = False
@@ -156,15 +171,8 @@ class BackgroundRemoverMobile(BoxLayout):
             self.show_error(f"Failed to load image: {str(e)}")
     
     def display_preview(self, pil_image):
-        # Convert PIL Image to texture
-        pil_image = pil_image.convert('RGB')
-        data = pil_image.tobytes()
-        
-        texture = Texture.create(size=(pil_image.width, pil_image.height), colorfmt='rgb')
-        texture.blit_buffer(data, colorfmt='rgb', bufferfmt='ubyte')
-        
-        # Update image widget
-        self.ids.preview_image.texture = texture
+        # Resized off the UI thread; only a widget-sized texture is uploaded
+        self.preview.show_image(pil_image)
     
     def process_image(self):
         if not self.input_image:
@@ -183,15 +191,16 @@ class BackgroundRemoverMobile(BoxLayout):
     def _remove_background(self):
         try:
             # Remove background
-            self.processed_image = remove(self.input_image)
+            result = self.remover.remove(self.input_image)
+            self.processed_image = result.image
             
             # Update UI in main thread
-            Clock.schedule_once(lambda dt: self._on_processing_complete())
+            Clock.schedule_once(lambda dt: self._on_processing_complete(result))
             
         except Exception as e:
             Clock.schedule_once(lambda dt: self._on_processing_error(str(e)))
     
-    def _on_processing_complete(self):
+    def _on_processing_complete(self, result):
         # Display processed image
         self.display_preview(self.processed_image)
         
@@ -199,11 +208,19 @@ class BackgroundRemoverMobile(BoxLayout):
         self.ids.progress_bar.value = 100
         self.ids.process_btn.text = "🚀 Process"
         self.ids.save_btn.disabled = False
-        self.ids.status_label.text = "Background removed successfully!"
+        self.ids.status_label.text = self._latency_text(result)
         
         # Show success message
         self.show_popup("Success", "Background removed successfully!")
     
+    def _latency_text(self, result):
+        text = f"Done via {result.backend} in {result.total_seconds:.1f}s"
+        averages = [f"{name} {stats['mean_ms'] / 1000:.1f}s"
+                    for name, stats in self.remover.stats().items() if stats['count']]
+        if len(averages) > 1:
+            text += f" (avg: {', '.join(averages)})"
+        return text
+    
     def _on_processing_error(self, error):
         # Reset UI
         self.ids.progress_bar.value = 0
@@ -0,0 +1,86 @@
+"""Texture-efficient preview for the Kivy ``Image`` widget.
+
+The photo is fitted to the widget's pixel size on a background thread
+(files are decoded with JPEG draft scaling, see bgremover/preview.py) and
+only that frame is uploaded, as RGBA with transparency on a checkerboard.
+The texture is reused while the frame size stays the same, and a render
+that was overtaken by a newer one is dropped, so texture memory follows
+the screen size rather than the photo size.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from kivy.clock import Clock
+from kivy.graphics.texture import Texture
+from kivy.logger import Logger
+
+from bgremover.preview import load_preview, render_preview
+
+
+class TexturePreview:
+    """Shows PIL images or image files in a Kivy ``Image`` widget"""
+
+    def __init__(self, widget):
+        self.widget = widget
+        self._texture = None
+        self._source = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        # One render thread; stale renders are skipped, not queued up
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._rerender = Clock.create_trigger(lambda dt: self._render(), 0.1)
+        widget.bind(size=lambda *args: self._rerender())
+
+    def show_image(self, image):
+        """Preview an in-memory PIL image (not modified)"""
+        self._source = lambda box: render_preview(image, box)
+        self._render()
+
+    def show_file(self, path):
+        """Preview an image file, decoded at reduced size"""
+        self._source = lambda box: render_preview(load_preview(path, box), box)
+        self._render()
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        self._source = None
+        self.widget.texture = None
+
+    def _render(self):
+        # UI thread
+        if self._source is None:
+            return
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        box = (max(1, int(self.widget.width)), max(1, int(self.widget.height)))
+        self._executor.submit(self._render_frame, self._source, box, generation)
+
+    def _render_frame(self, source, box, generation):
+        # Render thread
+        if generation != self._generation:
+            return
+        try:
+            frame = source(box)
+            data = frame.tobytes()
+        except Exception:
+            Logger.exception("Preview: rendering failed")
+            return
+        Clock.schedule_once(lambda dt: self._upload(frame.size, data, generation))
+
+    def _upload(self, size, data, generation):
+        # UI thread
+        if generation != self._generation:
+            return
+        texture = self._texture
+        if texture is None or tuple(texture.size) != size:
+            texture = Texture.create(size=size, colorfmt='rgba')
+            # PIL rows run top to bottom, GL textures bottom to top
+            texture.flip_vertical()
+            self._texture = texture
+        texture.blit_buffer(data, colorfmt='rgba', bufferfmt='ubyte')
+        if self.widget.texture is texture:
+            self.widget.canvas.ask_update()
+        else:
+            self.widget.texture = texture
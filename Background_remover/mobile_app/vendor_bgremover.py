@@ -0,0 +1,25 @@
+"""Copy the shared bgremover package into this directory.
+
+buildozer only packages the app directory, so run this before building:
+
+    python vendor_bgremover.py && buildozer android debug
+
+For desktop runs, ``pip install -e ..`` works as well.
+"""
+import os
+import shutil
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(os.path.dirname(HERE), "bgremover")
+TARGET = os.path.join(HERE, "bgremover")
+
+
+def main():
+    if os.path.isdir(TARGET):
+        shutil.rmtree(TARGET)
+    shutil.copytree(SOURCE, TARGET, ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+    print(f"Copied {SOURCE} -> {TARGET}")
+
+
+if __name__ == "__main__":
+    main()
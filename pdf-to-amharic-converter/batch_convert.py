@@ -0,0 +1,300 @@
+"""Headless batch conversion of a directory tree of PDFs.
+
+    python batch_convert.py archive/ -o texts/
+    python batch_convert.py archive/ -o texts/ --workers 8 --retry-failed
+    python batch_convert.py archive/ -o texts/ --blocks
+
+Every PDF under the input directory is queued in a SQLite file in the
+output directory and converted to a .txt file at the same relative path.
+Running the same command again resumes: finished documents are skipped,
+half-done ones continue from their checkpointed pages.
+
+All documents share one OCR engine and their pages are fed to it as a
+single stream, so while the last pages of one PDF are still being read
+the first pages of the next are already being OCR'd; many small PDFs keep
+all workers busy just like one large one. A JSON run report with
+pages/sec and the failed documents is written at the end. With
+``--blocks`` the text blocks of each document (bounding box and text, per
+page) are also written to ``<output>.blocks.json``.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from job_queue import JobQueue
+from job_store import JobStore
+from layout import LayoutConfig
+from ocr_backends import BACKENDS
+from ocr_engine import OCREngine, default_workers
+from output_writer import OrderedPageWriter
+from preprocess import PreprocessConfig
+from rasterizer import DEFAULT_DPI, iter_pages, page_count, render_page
+from text_layer import usable_text_layer
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_NO_INPUT = 2
+
+QUEUE_FILE = "batch_queue.sqlite3"
+REPORT_FILE = "batch_report.json"
+
+
+def find_pdfs(directory):
+    """PDF files under ``directory``, in a stable order"""
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(".pdf"):
+                yield os.path.join(dirpath, name)
+
+
+def output_path_for(pdf_path, input_dir, output_dir):
+    """Mirror the input layout: ``input_dir/a/b.pdf`` -> ``output_dir/a/b.txt``"""
+    relative = os.path.relpath(pdf_path, input_dir)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + ".txt")
+
+
+class Document:
+    """One PDF in the run: its checkpoints, output writer and page tally"""
+
+    def __init__(self, row, engine, poppler_path=None):
+        self.id = row["id"]
+        self.pdf_path = row["pdf_path"]
+        self.output_path = row["output_path"]
+        self.error = None
+        self.started = time.monotonic()
+
+        self.store = JobStore.for_pdf(self.pdf_path, engine.params())
+        self.total_pages = self.store.total_pages
+        if not self.total_pages:
+            self.total_pages = page_count(self.pdf_path, poppler_path=poppler_path)
+            self.store.total_pages = self.total_pages
+
+        done_pages = self.store.completed_pages()
+        self.cached_pages = len(done_pages)
+        pending = [i for i in range(1, self.total_pages + 1) if i not in done_pages]
+        layer = usable_text_layer(self.pdf_path, self.total_pages, poppler_path) if pending else {}
+        for page_no in pending:
+            if page_no in layer:
+                self.store.put(page_no, layer[page_no])
+                done_pages.add(page_no)
+        self.text_layer_pages = len(done_pages) - self.cached_pages
+        self.ocr_pages = [i for i in pending if i not in done_pages]
+        self.remaining = len(self.ocr_pages)
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        self.writer = OrderedPageWriter(self.output_path, self.total_pages,
+                                        load_page=self.store.get)
+        for page_no in sorted(done_pages):
+            self.writer.add(page_no)
+
+
+class BatchRun:
+    """Converts every pending document of a ``JobQueue``"""
+
+    def __init__(self, queue, workers=None, backend="auto", dpi=DEFAULT_DPI,
+                 poppler_path=None, layout=True, keep_blocks=False, log=None):
+        self.queue = queue
+        self.poppler_path = poppler_path
+        self.log = log or (lambda message: print(message, file=sys.stderr))
+        # Adaptive DPI re-renders pages in the workers, so they need the
+        # PDF of each page key
+        self._pdf_paths = {}
+        self.engine = OCREngine(
+            workers=workers,
+            preprocess=PreprocessConfig(),
+            dpi=dpi,
+            render=lambda key, page_dpi: render_page(self._pdf_paths[key[0]], key[1],
+                                                     page_dpi, poppler_path),
+            backend=backend,
+            layout=LayoutConfig() if layout else None,
+            keep_blocks=keep_blocks,
+        )
+        self.keep_blocks = keep_blocks
+        self.active = {}
+        self.interrupted = False
+        self.elapsed = 0.0
+        self.stats = {
+            "documents_done": 0,
+            "documents_failed": 0,
+            "pages": 0,
+            "ocr_pages": 0,
+            "text_layer_pages": 0,
+            "cached_pages": 0,
+        }
+
+    def _finish(self, doc):
+        del self.active[doc.id]
+        doc.writer.commit()
+        if self.keep_blocks:
+            self._write_blocks(doc)
+        self.queue.mark_done(doc.id, doc.total_pages, len(doc.ocr_pages))
+        self.stats["documents_done"] += 1
+        self.stats["pages"] += doc.total_pages
+        self.stats["text_layer_pages"] += doc.text_layer_pages
+        self.stats["cached_pages"] += doc.cached_pages
+        self.log(f"[done] {doc.pdf_path} ({doc.total_pages} pages, "
+                 f"{time.monotonic() - doc.started:.1f}s)")
+
+    def _write_blocks(self, doc):
+        """``{page_no: [{"bbox", "text"}, ...]}`` for every page that has blocks"""
+        pages = {}
+        for page_no in range(1, doc.total_pages + 1):
+            blocks = doc.store.get_blocks(page_no)
+            if blocks is not None:
+                pages[page_no] = blocks
+        with open(os.path.splitext(doc.output_path)[0] + ".blocks.json", "w",
+                  encoding="utf-8") as f:
+            json.dump(pages, f, ensure_ascii=False)
+
+    def _fail(self, doc_id, pdf_path, error):
+        doc = self.active.pop(doc_id, None)
+        if doc is not None:
+            doc.error = error
+            doc.writer.abort()
+        self.queue.mark_failed(doc_id, error)
+        self.stats["documents_failed"] += 1
+        self.log(f"[failed] {pdf_path}: {error}")
+
+    def _pages(self):
+        """Pages of every pending document as one stream keyed ``(doc_id, page_no)``"""
+        for row in self.queue.pending():
+            self.queue.mark_running(row["id"])
+            self._pdf_paths[row["id"]] = row["pdf_path"]
+            try:
+                doc = Document(row, self.engine, self.poppler_path)
+            except Exception as e:
+                self._fail(row["id"], row["pdf_path"], str(e))
+                continue
+
+            self.active[doc.id] = doc
+            if not doc.remaining:
+                self._finish(doc)
+                continue
+            try:
+                for page_no, image in iter_pages(doc.pdf_path, poppler_path=self.poppler_path,
+                                                 dpi=self.engine.dpi, page_numbers=doc.ocr_pages):
+                    if doc.error:
+                        break
+                    yield (doc.id, page_no), image
+            except Exception as e:
+                if not doc.error:
+                    self._fail(doc.id, doc.pdf_path, f"rendering failed: {e}")
+
+    def run(self):
+        start = time.monotonic()
+        try:
+            with self.engine:
+                for (doc_id, page_no), text in self.engine.run(self._pages(), return_exceptions=True):
+                    doc = self.active.get(doc_id)
+                    if doc is None:
+                        # Page of a document that has already failed
+                        continue
+                    if isinstance(text, Exception):
+                        self._fail(doc.id, doc.pdf_path, f"page {page_no}: {text}")
+                        continue
+                    doc.store.put(page_no, text)
+                    if self.keep_blocks:
+                        doc.store.put_blocks(page_no, self.engine.blocks.pop((doc_id, page_no), []))
+                    doc.writer.add(page_no, text)
+                    doc.remaining -= 1
+                    self.stats["ocr_pages"] += 1
+                    if not doc.remaining:
+                        self._finish(doc)
+        except KeyboardInterrupt:
+            # Finished pages are checkpointed and unfinished documents go
+            # back to pending when the queue is next opened
+            self.interrupted = True
+            for doc in self.active.values():
+                doc.writer.abort()
+            self.active.clear()
+        finally:
+            self.elapsed = time.monotonic() - start
+
+        for doc in list(self.active.values()):
+            self._fail(doc.id, doc.pdf_path, "not every page came back from OCR")
+
+    def report(self):
+        elapsed = max(self.elapsed, 1e-9)
+        report = {
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "interrupted": self.interrupted,
+            "workers": self.engine.workers,
+            "backend": self.engine.backend.name,
+            "elapsed_seconds": round(self.elapsed, 2),
+        }
+        report.update(self.stats)
+        report["pages_per_second"] = round(self.stats["pages"] / elapsed, 3)
+        report["ocr_pages_per_second"] = round(self.stats["ocr_pages"] / elapsed, 3)
+        report["queue"] = self.queue.counts()
+        report["failures"] = [
+            {"pdf": row["pdf_path"], "error": row["error"], "attempts": row["attempts"]}
+            for row in self.queue.failures()
+        ]
+        return report
+
+
+def print_report(report, stream=sys.stdout):
+    print(f"Documents: {report['documents_done']} converted, {report['documents_failed']} failed"
+          f"{' (interrupted)' if report['interrupted'] else ''}", file=stream)
+    print(f"Pages: {report['pages']} ({report['ocr_pages']} OCR, "
+          f"{report['text_layer_pages']} text layer, {report['cached_pages']} checkpointed)",
+          file=stream)
+    print(f"Time: {report['elapsed_seconds']:.1f}s | {report['pages_per_second']:.2f} pages/s | "
+          f"OCR {report['ocr_pages_per_second']:.2f} pages/s "
+          f"({report['workers']} workers, {report['backend']})", file=stream)
+    for failure in report["failures"]:
+        print(f"  FAILED {failure['pdf']}: {failure['error']}", file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input_dir", help="directory searched recursively for PDFs")
+    parser.add_argument("-o", "--output-dir", required=True)
+    parser.add_argument("-w", "--workers", type=int, default=default_workers())
+    parser.add_argument("--backend", choices=BACKENDS, default="auto")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI)
+    parser.add_argument("--poppler-path")
+    parser.add_argument("--queue", help=f"queue database (default: OUTPUT_DIR/{QUEUE_FILE})")
+    parser.add_argument("--report", help=f"JSON run report (default: OUTPUT_DIR/{REPORT_FILE})")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="queue documents that failed in an earlier run again")
+    parser.add_argument("--no-layout", action="store_true",
+                        help="OCR whole pages instead of the detected text blocks")
+    parser.add_argument("--blocks", action="store_true",
+                        help="also write each document's text block bounding boxes")
+    args = parser.parse_args(argv)
+
+    pdfs = list(find_pdfs(args.input_dir))
+    if not pdfs:
+        print(f"No PDF files found in {args.input_dir}", file=sys.stderr)
+        return EXIT_NO_INPUT
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    queue = JobQueue(args.queue or os.path.join(args.output_dir, QUEUE_FILE))
+    try:
+        for pdf_path in pdfs:
+            queue.add(pdf_path, output_path_for(pdf_path, args.input_dir, args.output_dir))
+        if args.retry_failed:
+            queue.retry_failed()
+
+        run = BatchRun(queue, workers=args.workers, backend=args.backend, dpi=args.dpi,
+                       poppler_path=args.poppler_path, layout=not args.no_layout,
+                       keep_blocks=args.blocks and not args.no_layout)
+        run.run()
+        report = run.report()
+    finally:
+        queue.close()
+
+    with open(args.report or os.path.join(args.output_dir, REPORT_FILE), "w",
+              encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_report(report)
+    return EXIT_FAILURES if report["failures"] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Benchmark OCR throughput and accuracy per preprocessing configuration.
+
+    python bench_preprocess.py book.pdf --pages 1-10 --reference book.txt
+    python bench_preprocess.py book.pdf --backend pytesseract
+    python bench_preprocess.py book.pdf --config full --layout
+
+Pages are rendered once and OCR'd under each configuration. Throughput is
+reported in pages per second. With ``--reference`` (the expected text for
+the same pages) accuracy is the character-level similarity of the OCR
+output to the reference.
+"""
+import argparse
+import difflib
+import time
+
+from ocr_backends import BACKENDS
+from layout import LayoutConfig
+from ocr_engine import OCREngine, default_workers
+from preprocess import PreprocessConfig
+from rasterizer import DEFAULT_DPI, iter_pages, render_page
+
+CONFIGURATIONS = {
+    "none": PreprocessConfig.disabled(),
+    "grayscale": PreprocessConfig(adaptive_dpi=False, binarize=False, deskew=False),
+    "binarize": PreprocessConfig(adaptive_dpi=False, deskew=False),
+    "binarize+deskew": PreprocessConfig(adaptive_dpi=False),
+    "full": PreprocessConfig(),
+}
+
+
+def parse_pages(spec):
+    first, _, last = spec.partition("-")
+    return int(first), int(last or first)
+
+
+def character_accuracy(text, reference):
+    """Similarity of two texts ignoring whitespace layout, 0..1"""
+    return difflib.SequenceMatcher(None, "".join(text.split()),
+                                   "".join(reference.split()), autojunk=False).ratio()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf")
+    parser.add_argument("--pages", default="1-5", help="page range, e.g. 3-12")
+    parser.add_argument("--reference", help="expected text of those pages (UTF-8)")
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI)
+    parser.add_argument("--poppler-path")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto")
+    parser.add_argument("--layout", action="store_true", help="OCR only detected text blocks")
+    parser.add_argument("--config", action="append", choices=sorted(CONFIGURATIONS),
+                        help="configuration(s) to run (default: all)")
+    args = parser.parse_args(argv)
+
+    first, last = parse_pages(args.pages)
+    pages = list(iter_pages(args.pdf, poppler_path=args.poppler_path, dpi=args.dpi,
+                            first_page=first, last_page=last))
+    reference = None
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            reference = f.read()
+
+    print(f"{'config':<16} {'backend':<12} {'pages/s':>8} {'accuracy':>9}")
+    for name in args.config or CONFIGURATIONS:
+        engine = OCREngine(
+            workers=args.workers,
+            preprocess=CONFIGURATIONS[name],
+            dpi=args.dpi,
+            render=lambda page_no, dpi: render_page(args.pdf, page_no, dpi, args.poppler_path),
+            backend=args.backend,
+            layout=LayoutConfig() if args.layout else None,
+        )
+        with engine:
+            start = time.monotonic()
+            texts = dict(engine.run(pages))
+            elapsed = time.monotonic() - start
+
+        accuracy = "-"
+        if reference is not None:
+            text = "\n".join(texts[page_no] for page_no in sorted(texts))
+            accuracy = f"{character_accuracy(text, reference):.1%}"
+        print(f"{name:<16} {engine.backend.name:<12} {len(pages) / elapsed:>8.2f} {accuracy:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Lazy, cached dependency probe.
+
+Finding Tesseract and Poppler, asking them for their versions and listing
+Tesseract's language packs means starting several processes. The results
+are cached in a small JSON file together with each binary's size and
+mtime (and, for Tesseract, the mtime of its tessdata directory, which
+changes when a language pack is added or removed), so later launches only
+``stat`` them and start no process at all unless something changed. ``probe_in_background`` runs the probe
+on a thread so the window can be shown first.
+"""
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import threading
+
+CONFIG_PATH = os.environ.get(
+    "AMHARIC_OCR_DEPS_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "amharic_ocr", "deps.json"),
+)
+
+# Bumped when the cached layout changes
+CACHE_VERSION = 2
+
+IS_WINDOWS = platform.system() == "Windows"
+
+TESSERACT_CANDIDATES = [
+    r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+    r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+] if IS_WINDOWS else []
+
+
+def _exe(name):
+    return name + ".exe" if IS_WINDOWS else name
+
+
+def find_tesseract():
+    """Path of the tesseract binary pytesseract will use, or None"""
+    try:
+        import pytesseract
+        configured = pytesseract.pytesseract.tesseract_cmd
+    except ImportError:
+        configured = "tesseract"
+    for candidate in [configured] + TESSERACT_CANDIDATES:
+        path = shutil.which(candidate)
+        if path:
+            return os.path.abspath(path)
+    return None
+
+
+def find_pdfinfo(poppler_path=None):
+    """Path of Poppler's pdfinfo (in ``poppler_path`` or on PATH), or None"""
+    if poppler_path:
+        path = os.path.join(poppler_path, _exe("pdfinfo"))
+        return path if os.path.isfile(path) else None
+    path = shutil.which("pdfinfo")
+    return os.path.abspath(path) if path else None
+
+
+def signature(path, cached=None):
+    """What has to stay the same for a cached probe to still be valid"""
+    stat = os.stat(path)
+    return {"path": path, "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except (OSError, TypeError):
+        return None
+
+
+def tesseract_signature(path, cached=None):
+    """``signature`` plus the tessdata directory the cached probe found"""
+    current = signature(path)
+    current["tessdata_prefix"] = os.environ.get("TESSDATA_PREFIX")
+    current["tessdata_mtime"] = _mtime((cached or {}).get("tessdata"))
+    return current
+
+
+def _run(cmd, timeout=15):
+    result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    # pdfinfo -v and older tesseracts print to stderr
+    return (result.stdout or result.stderr).decode("utf-8", errors="replace")
+
+
+def probe_tesseract(path):
+    output = _run([path, "--version"]).strip()
+    version = output.splitlines()[0] if output else ""
+    # First line is a header: List of available languages in "<tessdata>/" (N):
+    header, *langs = _run([path, "--list-langs"]).splitlines() or [""]
+    match = re.search(r'"(.+?)"', header)
+    tessdata = os.path.abspath(match.group(1)) if match else None
+    return {
+        "version": version,
+        "langs": sorted(lang.strip() for lang in langs if lang.strip()),
+        "tessdata": tessdata,
+        "tessdata_mtime": _mtime(tessdata),
+    }
+
+
+def probe_poppler(path):
+    for line in _run([path, "-v"]).splitlines():
+        if "version" in line.lower():
+            return {"version": line.strip()}
+    return {"version": ""}
+
+
+def load_cache(config_path=CONFIG_PATH):
+    try:
+        with open(config_path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if cache.get("cache_version") == CACHE_VERSION else {}
+
+
+def save_cache(cache, config_path=CONFIG_PATH):
+    os.makedirs(os.path.dirname(config_path), exist_ok=True)
+    tmp_path = config_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, config_path)
+
+
+def _checked(cached, path, probe, sign=signature):
+    """Cached entry if ``path`` is unchanged, otherwise a fresh probe (None if missing)"""
+    if path is None:
+        return None
+    current = sign(path, cached)
+    if cached and all(cached.get(key) == value for key, value in current.items()):
+        return cached
+    try:
+        current.update(probe(path))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return current
+
+
+def probe(poppler_path=None, config_path=CONFIG_PATH):
+    """``{"tesseract": info or None, "poppler": info or None}``, cached on disk.
+
+    ``info`` holds the binary's path, size, mtime and version, plus the
+    installed languages and their tessdata directory for Tesseract.
+    """
+    cache = load_cache(config_path)
+    result = {
+        "cache_version": CACHE_VERSION,
+        "tesseract": _checked(cache.get("tesseract"), find_tesseract(), probe_tesseract,
+                              tesseract_signature),
+        "poppler": _checked(cache.get("poppler"), find_pdfinfo(poppler_path), probe_poppler),
+    }
+    if result != cache:
+        try:
+            save_cache(result, config_path)
+        except OSError:
+            pass
+    return result
+
+
+def problems(info, lang="amh"):
+    """Names of what is missing: ``tesseract``, ``lang`` and/or ``poppler``"""
+    missing = []
+    if info["tesseract"] is None:
+        missing.append("tesseract")
+    elif lang not in info["tesseract"]["langs"]:
+        missing.append("lang")
+    if info["poppler"] is None:
+        missing.append("poppler")
+    return missing
+
+
+def probe_in_background(callback, poppler_path=None, config_path=CONFIG_PATH):
+    """Run ``probe`` on a daemon thread and pass its result to ``callback``.
+
+    The callback runs on that thread; GUI code should hand it to its own
+    event loop (e.g. ``root.after``).
+    """
+    thread = threading.Thread(
+        target=lambda: callback(probe(poppler_path, config_path)), daemon=True)
+    thread.start()
+    return thread
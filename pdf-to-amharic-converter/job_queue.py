@@ -0,0 +1,106 @@
+"""Persistent document queue for batch runs.
+
+One SQLite row per PDF records where it is in the run (pending, running,
+done or failed), so an overnight batch that is stopped or crashes picks up
+with the documents it had not finished. Page-level progress inside a
+document is kept by ``JobStore`` as usual.
+"""
+import os
+import sqlite3
+import time
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    pdf_path TEXT NOT NULL UNIQUE,
+    output_path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    total_pages INTEGER,
+    ocr_pages INTEGER,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started REAL,
+    finished REAL
+)
+"""
+
+
+class JobQueue:
+    """Documents of a batch run, stored in ``db_path``"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(SCHEMA)
+            # Documents that were running when the last run died start over
+            self._db.execute("UPDATE documents SET status = ? WHERE status = ?",
+                             (PENDING, RUNNING))
+
+    def close(self):
+        self._db.close()
+
+    def add(self, pdf_path, output_path):
+        """Queue a PDF; a finished one is queued again if the file changed"""
+        stat = os.stat(pdf_path)
+        pdf_path = os.path.abspath(pdf_path)
+        with self._db:
+            row = self._db.execute("SELECT size, mtime FROM documents WHERE pdf_path = ?",
+                                   (pdf_path,)).fetchone()
+            if row is None:
+                self._db.execute(
+                    "INSERT INTO documents (pdf_path, output_path, size, mtime) VALUES (?, ?, ?, ?)",
+                    (pdf_path, output_path, stat.st_size, stat.st_mtime))
+            elif (row["size"], row["mtime"]) != (stat.st_size, stat.st_mtime):
+                self._db.execute(
+                    "UPDATE documents SET output_path = ?, size = ?, mtime = ?, status = ?, "
+                    "error = NULL, attempts = 0 WHERE pdf_path = ?",
+                    (output_path, stat.st_size, stat.st_mtime, PENDING, pdf_path))
+
+    def retry_failed(self):
+        with self._db:
+            self._db.execute("UPDATE documents SET status = ?, error = NULL WHERE status = ?",
+                             (PENDING, FAILED))
+
+    def pending(self):
+        """Queued documents, oldest first"""
+        return self._db.execute("SELECT * FROM documents WHERE status = ? ORDER BY id",
+                                (PENDING,)).fetchall()
+
+    def mark_running(self, doc_id):
+        with self._db:
+            self._db.execute(
+                "UPDATE documents SET status = ?, attempts = attempts + 1, started = ? WHERE id = ?",
+                (RUNNING, time.time(), doc_id))
+
+    def mark_done(self, doc_id, total_pages, ocr_pages):
+        with self._db:
+            self._db.execute(
+                "UPDATE documents SET status = ?, total_pages = ?, ocr_pages = ?, error = NULL, "
+                "finished = ? WHERE id = ?",
+                (DONE, total_pages, ocr_pages, time.time(), doc_id))
+
+    def mark_failed(self, doc_id, error):
+        with self._db:
+            self._db.execute("UPDATE documents SET status = ?, error = ?, finished = ? WHERE id = ?",
+                             (FAILED, error, time.time(), doc_id))
+
+    def counts(self):
+        """``{status: number of documents}``"""
+        rows = self._db.execute("SELECT status, COUNT(*) FROM documents GROUP BY status")
+        return {status: count for status, count in rows}
+
+    def failures(self):
+        return self._db.execute(
+            "SELECT pdf_path, error, attempts FROM documents WHERE status = ? ORDER BY id",
+            (FAILED,)).fetchall()
@@ -0,0 +1,113 @@
+"""Resumable, checkpointed OCR jobs.
+
+Every finished page is written to a job directory as soon as it is done,
+so a crash or a closed window only loses the pages that were in flight.
+The job directory is keyed on a hash of the PDF bytes plus the OCR
+parameters: running the same PDF again resumes where it stopped, and if
+only the output path changed, every page comes from the store and the
+output file is written without any OCR.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+DEFAULT_JOBS_DIR = os.environ.get(
+    "AMHARIC_OCR_JOBS_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "amharic_ocr", "jobs"),
+)
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """sha256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_hash(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def _write_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class JobStore:
+    """Per-page results of one (PDF, OCR parameters) job"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def for_pdf(cls, pdf_path, params, jobs_dir=DEFAULT_JOBS_DIR):
+        key = f"{file_hash(pdf_path)[:24]}-{params_hash(params)[:12]}"
+        store = cls(os.path.join(jobs_dir, key))
+        manifest = store.manifest()
+        if not manifest:
+            store.write_manifest({"pdf": os.path.abspath(pdf_path), "params": params})
+        return store
+
+    def _page_path(self, page_no):
+        return os.path.join(self.directory, f"page_{page_no:05d}.txt")
+
+    def manifest(self):
+        try:
+            with open(os.path.join(self.directory, "job.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_manifest(self, manifest):
+        _write_atomic(os.path.join(self.directory, "job.json"),
+                      json.dumps(manifest, ensure_ascii=False, indent=2))
+
+    @property
+    def total_pages(self):
+        return self.manifest().get("total_pages")
+
+    @total_pages.setter
+    def total_pages(self, value):
+        manifest = self.manifest()
+        manifest["total_pages"] = value
+        self.write_manifest(manifest)
+
+    def get(self, page_no):
+        try:
+            with open(self._page_path(page_no), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, page_no, text):
+        _write_atomic(self._page_path(page_no), text)
+
+    def put_blocks(self, page_no, blocks):
+        """Keep a page's ``TextBlock`` list next to its text"""
+        data = [{"bbox": list(block.bbox), "text": block.text} for block in blocks]
+        _write_atomic(self._page_path(page_no)[:-4] + ".blocks.json",
+                      json.dumps(data, ensure_ascii=False))
+
+    def get_blocks(self, page_no):
+        try:
+            with open(self._page_path(page_no)[:-4] + ".blocks.json", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def completed_pages(self):
+        pages = set()
+        for name in os.listdir(self.directory):
+            if name.startswith("page_") and name.endswith(".txt"):
+                pages.add(int(name[5:-4]))
+        return pages
+
+    def load_all(self):
+        """``{page_no: text}`` for every finished page"""
+        return {page_no: self.get(page_no) for page_no in sorted(self.completed_pages())}
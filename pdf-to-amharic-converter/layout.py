@@ -0,0 +1,207 @@
+"""Page layout analysis: find the text blocks worth OCR'ing.
+
+The page is split with a recursive XY-cut on its ink projection profiles,
+with gaps measured against the glyph height so the thresholds follow the
+scan resolution. A gutter running the full height of a region is cut
+first, at the widest one, so each column is read to the end before the
+next. Without one, the region is cut at its empty rows, but neighbouring
+bands whose column gutters line up are kept together: a two-column
+stretch between a heading and a full-width figure stays one section, to
+be cut into columns, instead of being sliced across both columns at every
+paragraph gap. The gaps between lines of one paragraph are never cut, and
+the order of the cuts is the reading order.
+
+Leaves that don't look like text are dropped before OCR: specks and rules
+too small to hold a glyph, photos and solid fills (too much ink), and
+drawings whose "lines" are far taller than a text line. Thin page borders
+carry too little ink per row or column to stop the cuts.
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from preprocess import TARGET_GLYPH_PX, estimate_glyph_height, ink_mask
+
+# bbox is (left, top, right, bottom) in pixels of the page as rendered, before
+# preprocessing (see page_bbox)
+TextBlock = namedtuple("TextBlock", "bbox text")
+
+# Rows/columns with less ink than this share of the region's width/height
+# count as empty
+NOISE_RATIO = 0.01
+MAX_DEPTH = 32
+
+
+class LayoutConfig:
+    """Layout thresholds, in multiples of the page's glyph height"""
+
+    def __init__(self, row_gap=1.2, column_gap=1.5, max_line_height=3.0, max_density=0.45,
+                 padding=0.5):
+        # Empty band needed to split paragraphs (rows) and columns
+        self.row_gap = row_gap
+        self.column_gap = column_gap
+        # Blocks whose text lines are taller than this are pictures
+        self.max_line_height = max_line_height
+        # Share of ink pixels above which a block is a photo or a fill
+        self.max_density = max_density
+        # Margin kept around each crop so edge strokes survive
+        self.padding = padding
+
+    def as_dict(self):
+        return {
+            "row_gap": self.row_gap,
+            "column_gap": self.column_gap,
+            "max_line_height": self.max_line_height,
+            "max_density": self.max_density,
+            "padding": self.padding,
+        }
+
+
+def _gaps(profile, min_gap, noise, inner=True):
+    """``(start, end)`` of the runs of empty entries at least ``min_gap`` long.
+
+    With ``inner`` the runs touching either end of the profile are left out.
+    """
+    empty = profile <= noise
+    edges = np.diff(np.concatenate(([0], empty.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return [(start, end) for start, end in zip(starts, ends)
+            if end - start >= min_gap and (not inner or (start > 0 and end < len(profile)))]
+
+
+def _shared_gutters(gutters, band_gutters, min_overlap):
+    """Overlaps of two lists of ``(start, end)`` gutters at least ``min_overlap`` wide"""
+    shared = []
+    for start, end in gutters:
+        for band_start, band_end in band_gutters:
+            overlap = (max(start, band_start), min(end, band_end))
+            if overlap[1] - overlap[0] >= min_overlap:
+                shared.append(overlap)
+    return shared
+
+
+def _sections(ink, box, row_gaps, column_gap):
+    """Split ``box`` at its row gaps, then rejoin neighbouring bands whose
+    column gutters line up, so each multi-column stretch stays one section
+    (to be cut into columns) instead of being sliced across its columns"""
+    left, top, right, bottom = box
+    edges = [top] + [top + (start + end) // 2 for start, end in row_gaps] + [bottom]
+    sections = []
+    gutters = []
+    for band_top, band_bottom in zip(edges, edges[1:]):
+        band = ink[band_top:band_bottom, left:right]
+        # A band that only fills some of the columns (the end of a longer
+        # column) has its gutter running into the margin: keep edge runs too
+        band_gutters = [(left + start, left + end) for start, end in
+                        _gaps(band.sum(axis=0), column_gap, band.shape[0] * NOISE_RATIO,
+                              inner=False)]
+        shared = _shared_gutters(gutters, band_gutters, column_gap / 2) if sections else []
+        if shared:
+            sections[-1][3] = band_bottom
+            gutters = shared
+        else:
+            sections.append([left, band_top, right, band_bottom])
+            gutters = band_gutters
+    return [tuple(section) for section in sections]
+
+
+def _xy_cut(ink, box, row_gap, column_gap, leaves, depth=0):
+    left, top, right, bottom = box
+    region = ink[top:bottom, left:right]
+    rows = region.sum(axis=1)
+    cols = region.sum(axis=0)
+    row_noise = region.shape[1] * NOISE_RATIO
+    col_noise = region.shape[0] * NOISE_RATIO
+
+    # Trim empty margins
+    filled_rows = np.flatnonzero(rows > row_noise)
+    filled_cols = np.flatnonzero(cols > col_noise)
+    if not filled_rows.size or not filled_cols.size:
+        return
+    top, bottom = top + filled_rows[0], top + filled_rows[-1] + 1
+    left, right = left + filled_cols[0], left + filled_cols[-1] + 1
+    rows = rows[filled_rows[0]:filled_rows[-1] + 1]
+    cols = cols[filled_cols[0]:filled_cols[-1] + 1]
+
+    row_gaps = _gaps(rows, row_gap, row_noise)
+    col_gaps = _gaps(cols, column_gap, col_noise)
+    if depth >= MAX_DEPTH or not (row_gaps or col_gaps):
+        leaves.append((int(left), int(top), int(right), int(bottom)))
+        return
+
+    if col_gaps:
+        # A gutter running the full height: read the left side, then the
+        # right, cutting once at the widest gutter and recursing
+        start, end = max(col_gaps, key=lambda gap: gap[1] - gap[0])
+        middle = left + (start + end) // 2
+        boxes = [(left, top, middle, bottom), (middle, top, right, bottom)]
+    else:
+        boxes = _sections(ink, (left, top, right, bottom), row_gaps, column_gap)
+        if len(boxes) == 1:
+            # Every band shares a gutter the region as a whole doesn't have
+            # (only noise fills it): fall back to the bands themselves
+            edges = [top] + [top + (start + end) // 2 for start, end in row_gaps] + [bottom]
+            boxes = [(left, a, right, b) for a, b in zip(edges, edges[1:])]
+    for sub_box in boxes:
+        _xy_cut(ink, sub_box, row_gap, column_gap, leaves, depth + 1)
+
+
+def is_text_block(block_ink, glyph_px, config):
+    """True if a block of the ink mask looks like lines of text"""
+    height, width = block_ink.shape
+    if height < glyph_px * 0.4 or width < glyph_px * 0.4:
+        return False
+    if block_ink.mean() > config.max_density:
+        return False
+    line_height = estimate_glyph_height(block_ink)
+    return line_height is not None and line_height <= glyph_px * config.max_line_height
+
+
+def find_text_blocks(image, config=None):
+    """Bounding boxes of the text blocks on a page, in reading order"""
+    config = config or LayoutConfig()
+    gray = image.convert('L') if image.mode != 'L' else image
+    ink = ink_mask(np.asarray(gray))
+    if not ink.any():
+        return []
+    glyph_px = estimate_glyph_height(ink) or TARGET_GLYPH_PX
+
+    leaves = []
+    _xy_cut(ink, (0, 0, ink.shape[1], ink.shape[0]),
+            config.row_gap * glyph_px, config.column_gap * glyph_px, leaves)
+
+    pad = int(config.padding * glyph_px)
+    blocks = []
+    for left, top, right, bottom in leaves:
+        if is_text_block(ink[top:bottom, left:right], glyph_px, config):
+            blocks.append((max(0, left - pad), max(0, top - pad),
+                           min(gray.width, right + pad), min(gray.height, bottom + pad)))
+    return blocks
+
+
+def page_bbox(bbox, size, info):
+    """Map a bbox on the prepared page (of ``size``) to rendered-page pixels.
+
+    Undoes the adaptive-DPI scale and the deskew rotation recorded in
+    ``info`` by ``preprocess_page``; a box on a deskewed page becomes the
+    upright box around its rotated corners, clipped to the page.
+    """
+    scale = info.get("scale", 1.0)
+    corners = [(x / scale, y / scale) for x in bbox[0::2] for y in bbox[1::2]]
+    angle = info.get("skew", 0.0)
+    page_width, page_height = info.get("size", (size[0] / scale, size[1] / scale))
+    if angle:
+        # rotate(expand=True) turns the page about its centre and grows the
+        # canvas around it, so rotate back about the centres
+        a = math.radians(angle)
+        cx, cy = size[0] / scale / 2, size[1] / scale / 2
+        corners = [(page_width / 2 + math.cos(a) * (x - cx) - math.sin(a) * (y - cy),
+                    page_height / 2 + math.sin(a) * (x - cx) + math.cos(a) * (y - cy))
+                   for x, y in corners]
+    xs = [x for x, _ in corners]
+    ys = [y for _, y in corners]
+    return (max(0, int(math.floor(min(xs)))), max(0, int(math.floor(min(ys)))),
+            min(int(page_width), int(math.ceil(max(xs)))),
+            min(int(page_height), int(math.ceil(max(ys)))))
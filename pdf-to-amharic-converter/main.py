@@ -2,7 +2,6 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
 import pytesseract
-from pdf2image import convert_from_path
 from PIL import Image, ImageTk
 import os
 import sys
@@ -10,6 +9,20 @@ from datetime import datetime
 import webbrowser
 import platform
 
+# The UI bus is shared with the other Tk app, one level up (shared/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.ui_bus import UIBus, format_eta
+
+from deps import probe_in_background, problems
+from job_store import JobStore
+from layout import LayoutConfig
+from ocr_engine import OCREngine, default_workers
+from output_writer import OrderedPageWriter
+from preprocess import PreprocessConfig
+from preview import TextPreview
+from rasterizer import iter_pages, page_count, render_page
+from text_layer import usable_text_layer
+
 class PDFAmharicExtractor:
     def __init__(self, root):
         self.root = root
@@ -25,6 +38,7 @@ class PDFAmharicExtractor:
         self.output_path = tk.StringVar()
         self.status_var = tk.StringVar(value="ምንም አልተጫነም")
         self.progress_var = tk.IntVar(value=0)
+        self.workers_var = tk.IntVar(value=default_workers())
         
         # Style configuration
         self.setup_styles()
@@ -32,8 +46,16 @@ class PDFAmharicExtractor:
         # Setup UI
         self.setup_ui()
         
-        # Check for Poppler
-        self.check_poppler()
+        # Every update from a worker thread goes through the bus; the Tk
+        # loop applies them at a fixed frame rate
+        self.bus = UIBus(self.root)
+        self.bus.on_progress(self.on_progress)
+        self.bus.on_frame(self.preview.flush)
+        self.bus.start()
+        
+        # Check for Tesseract and Poppler once the window is up
+        self.dependencies = None
+        self.root.after(0, self.check_dependencies)
         
     def get_poppler_path(self):
         """Get Poppler path based on operating system"""
@@ -65,29 +87,40 @@ class PDFAmharicExtractor:
             
         return None
     
-    def check_poppler(self):
-        """Check if Poppler is installed and show instructions if not"""
-        try:
-            # Try to convert a dummy PDF to test
-            test_pdf = "test_dummy.pdf"
-            if not os.path.exists(test_pdf):
-                # Create a minimal dummy PDF file for testing
-                with open(test_pdf, 'wb') as f:
-                    f.write(b'%PDF-1.4\n1 0 obj\n<<>>\nendobj\nxref\n0 2\n0000000000 65535 f\n0000000010 00000 n\ntrailer\n<< /Size 2 /Root 1 0 R >>\nstartxref\n20\n%%EOF\n')
-                
-            # Test conversion
-            if self.poppler_path:
-                convert_from_path(test_pdf, poppler_path=self.poppler_path)
-            else:
-                convert_from_path(test_pdf)
-                
-            # Clean up test file
-            if os.path.exists(test_pdf):
-                os.remove(test_pdf)
-                
-        except Exception as e:
-            # Show installation instructions
+    def check_dependencies(self):
+        """Probe Tesseract and Poppler in the background (cached between runs)"""
+        probe_in_background(lambda info: self.bus.call(self.on_dependencies, info),
+                            poppler_path=self.poppler_path)
+    
+    def on_dependencies(self, info):
+        """Show what the dependency probe found"""
+        self.dependencies = info
+        missing = problems(info)
+        
+        if info["tesseract"]:
+            # Also finds Tesseract in its default Windows folder when it isn't on PATH
+            pytesseract.pytesseract.tesseract_cmd = info["tesseract"]["path"]
+        
+        if "poppler" in missing:
+            self.poppler_label.config(text="⚠ Poppler ማስተካከያ ያስፈልጋል", foreground=self.warning_color)
             self.show_poppler_instructions()
+        else:
+            self.poppler_label.config(text="✓ Poppler ተገኝቷል", foreground=self.success_color)
+        
+        if "tesseract" in missing:
+            self.show_tesseract_instructions()
+        elif "lang" in missing:
+            messagebox.showwarning("ማስጠንቀቂያ",
+                                   "የአማርኛ ቋንቋ መለያ (amh.traineddata) አልተገኘም!\n\n"
+                                   "ከዚህ ያውርዱ: https://github.com/tesseract-ocr/tessdata")
+    
+    def show_tesseract_instructions(self):
+        """Show instructions for installing Tesseract"""
+        messagebox.showerror("ስህተት", 
+                           "Tesseract OCR አልተገኘም!\n\nእባክዎ የሚከተሉትን ያግኙ:\n"
+                           "1. Tesseract OCR ከዚህ ያውርዱ: https://github.com/UB-Mannheim/tesseract/wiki\n"
+                           "2. Amharic ቋንቋ መለያ ያክሉ: https://github.com/tesseract-ocr/tessdata\n"
+                           "3. መቀመጫውን ያረጋግጡ: pytesseract.pytesseract.tesseract_cmd = r'C:\\Program Files\\Tesseract-OCR\\tesseract.exe'")
     
     def show_poppler_instructions(self):
         """Show instructions for installing Poppler"""
@@ -211,16 +244,28 @@ After installation, restart the application."""
                                       style='Custom.TButton')
         browse_output_btn.pack(side=tk.LEFT)
         
+        # OCR worker count
+        workers_frame = ttk.Frame(output_frame)
+        workers_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Label(workers_frame, text="ትይዩ ሠራተኞች:", 
+                 font=('Arial Unicode MS', 12)).pack(side=tk.LEFT, padx=(0, 10))
+        
+        workers_spin = ttk.Spinbox(workers_frame,
+                                   from_=1,
+                                   to=max(1, os.cpu_count() or 1) * 2,
+                                   textvariable=self.workers_var,
+                                   width=5)
+        workers_spin.pack(side=tk.LEFT)
+        
         # Poppler Status Frame
         poppler_frame = ttk.Frame(main_container)
         poppler_frame.pack(fill=tk.X, pady=(0, 10))
         
-        poppler_status = "✓ Poppler ተገኝቷል" if self.poppler_path else "⚠ Poppler ማስተካከያ ያስፈልጋል"
-        poppler_color = self.success_color if self.poppler_path else self.warning_color
-        
+        # Updated when the background dependency probe finishes
         self.poppler_label = ttk.Label(poppler_frame,
-                                      text=poppler_status,
-                                      foreground=poppler_color,
+                                      text="Poppler በመፈተሽ ላይ...",
+                                      foreground=self.fg_color,
                                       font=('Arial Unicode MS', 10, 'bold'))
         self.poppler_label.pack()
         
@@ -291,6 +336,7 @@ After installation, restart the application."""
         
         # Add tag for highlighting Amharic text
         self.text_preview.tag_configure("amharic", foreground="green", font=('Arial Unicode MS', 11, 'bold'))
+        self.preview = TextPreview(self.text_preview, tag="amharic")
         
         # Statistics Frame (bottom)
         stats_frame = ttk.Frame(main_container)
@@ -359,114 +405,121 @@ After installation, restart the application."""
         self.open_btn.config(state=tk.DISABLED)
         
         # Start conversion in separate thread
-        thread = threading.Thread(target=self.convert_pdf)
+        self.ocr_workers = self.workers_var.get()
+        thread = threading.Thread(target=self.convert_pdf,
+                                  args=(self.pdf_path.get(), self.output_path.get()))
         thread.daemon = True
         thread.start()
         
-    def convert_pdf(self):
-        """Convert PDF to Amharic text"""
+    def convert_pdf(self, pdf_path, output_path):
+        """Convert PDF to Amharic text (runs on a worker thread; UI changes go through the bus)"""
         try:
-            self.status_var.set("ፒዲኤፉ በመቀየር ላይ...")
-            self.progress_var.set(10)
+            self.bus.set("status", self.status_var.set, "ፒዲኤፉ በመቀየር ላይ...")
+            self.bus.set("progress", self.progress_var.set, 10)
             
             # Convert PDF to images
-            self.root.after(0, self.update_preview, "ፒዲኤፉ ወደ ምስል በመቀየር ላይ...\n")
+            self.bus.call(self.update_preview, "ፒዲኤፉ ወደ ምስል በመቀየር ላይ...\n")
             
-            # Use Poppler path if configured
-            if self.poppler_path:
-                pages = convert_from_path(self.pdf_path.get(), poppler_path=self.poppler_path)
-            else:
-                pages = convert_from_path(self.pdf_path.get())
-                
-            total_pages = len(pages)
+            # Finished pages are checkpointed per (PDF, OCR parameters), so a
+            # re-run resumes and an unchanged PDF needs no OCR at all
+            engine = OCREngine(
+                workers=self.ocr_workers,
+                preprocess=PreprocessConfig(),
+                # Only text blocks are OCR'd; margins and pictures are skipped
+                layout=LayoutConfig(),
+                render=lambda page_no, dpi: render_page(pdf_path, page_no, dpi, self.poppler_path),
+            )
+            store = JobStore.for_pdf(pdf_path, engine.params())
+            total_pages = store.total_pages
+            if not total_pages:
+                total_pages = page_count(pdf_path, poppler_path=self.poppler_path)
+                store.total_pages = total_pages
             
-            self.progress_var.set(30)
-            self.root.after(0, self.update_preview, f"ጠቅላላ ገጾች: {total_pages}\n\n")
+            done_pages = store.completed_pages()
+            cached_pages = len(done_pages)
+            pending = [i for i in range(1, total_pages + 1) if i not in done_pages]
             
-            full_text = ""
+            # Pages with a usable Ethiopic text layer skip OCR entirely
+            layer = usable_text_layer(pdf_path, total_pages, poppler_path=self.poppler_path) if pending else {}
+            for page_no in pending:
+                if page_no in layer:
+                    store.put(page_no, layer[page_no])
+                    done_pages.add(page_no)
+            extracted_pages = len(done_pages) - cached_pages
+            ocr_pages = [i for i in pending if i not in done_pages]
             
-            # Process each page
-            for i, page in enumerate(pages, 1):
-                self.status_var.set(f"ገጽ {i}/{total_pages} በማንበብ ላይ...")
-                
-                # Extract text with Amharic language
-                text = pytesseract.image_to_string(page, lang='amh')
-                full_text += f"\n--- ገጽ {i} ---\n{text}\n"
-                
-                # Update progress
-                progress_value = 30 + (i / total_pages) * 60
-                self.progress_var.set(progress_value)
-                
-                # Update preview with current page text
-                self.root.after(0, self.update_preview, f"ገጽ {i} ተጠናቋል ✓\n")
+            # Pages are rendered a few at a time as OCR asks for them
+            # (Poppler path is None when it is on PATH)
+            pages = iter_pages(pdf_path, poppler_path=self.poppler_path, page_numbers=ocr_pages)
             
-            # Save to file
-            self.root.after(0, self.update_preview, "\nውጤቱን በመቀመጥ ላይ...\n")
+            self.bus.set("progress", self.progress_var.set, 30)
+            self.bus.call(self.append_preview,
+                          f"ጠቅላላ ገጾች: {total_pages} (ለOCR: {len(ocr_pages)})\n\n")
+            # Throughput and ETA are measured over the pages that need OCR
+            self.bus.call(self.bus.start_job, len(ocr_pages))
             
-            with open(self.output_path.get(), "w", encoding="utf-8") as f:
-                f.write(full_text)
+            # OCR in parallel; pages are written and previewed in order
+            on_write = lambda page_no, chunk: self.bus.call(self.append_preview, chunk)
+            with engine, OrderedPageWriter(output_path, total_pages, load_page=store.get,
+                                           on_write=on_write) as writer:
+                for page_no in sorted(done_pages):
+                    writer.add(page_no)
+                
+                done = 0
+                for page_no, text in engine.run(pages):
+                    store.put(page_no, text)
+                    writer.add(page_no, text)
+                    done += 1
+                    # Coalesced by the bus; see on_progress
+                    self.bus.progress(done)
             
-            self.progress_var.set(100)
-            self.status_var.set("በተሳካ ሁኔታ ተጠናቋል!")
+            self.bus.set("progress", self.progress_var.set, 100)
+            self.bus.set("status", self.status_var.set, "በተሳካ ሁኔታ ተጠናቋል!")
             
             # Show success message
-            self.root.after(0, messagebox.showinfo, "እንኳን ደስ አለህ!", 
-                          f"ጽሑፉ በተሳካ ሁኔታ ተወስዷል!\n\nየወጣበት ቦታ: {self.output_path.get()}")
-            
-            # Update preview with extracted text (first 5000 characters)
-            preview_text = full_text[:5000] + ("..." if len(full_text) > 5000 else "")
-            self.root.after(0, self.update_preview, preview_text)
+            self.bus.call(messagebox.showinfo, "እንኳን ደስ አለህ!", 
+                          f"ጽሑፉ በተሳካ ሁኔታ ተወስዷል!\n\nየወጣበት ቦታ: {output_path}")
             
             # Enable buttons
-            self.root.after(0, lambda: self.convert_btn.config(state=tk.NORMAL))
-            self.root.after(0, lambda: self.open_btn.config(state=tk.NORMAL))
+            self.bus.call(self.convert_btn.config, {"state": tk.NORMAL})
+            self.bus.call(self.open_btn.config, {"state": tk.NORMAL})
             
-            # Update statistics
-            char_count = len(full_text)
-            word_count = len(full_text.split())
-            self.update_stats(f"ገጾች: {total_pages} | ቃላት: {word_count:,} | ፊደላት: {char_count:,}")
+            # Update statistics (counted while writing)
+            self.bus.call(self.update_stats, f"ገጾች: {total_pages} | በOCR: {len(ocr_pages)} | "
+                              f"ከጽሑፍ ንብርብር: {extracted_pages} | ከመሸጎጫ: {cached_pages} | "
+                              f"ቃላት: {writer.words:,} | ፊደላት: {writer.chars:,} | "
+                              f"ሞተር: {engine.backend.name}")
             
         except Exception as e:
-            self.root.after(0, messagebox.showerror, "ስህተት", 
+            self.bus.call(messagebox.showerror, "ስህተት", 
                           f"ስህተት ተከስቷል: {str(e)}\n\n"
                           f"የሚከተሉትን ያረጋግጡ:\n"
                           f"1. Poppler ተጭኗል።\n"
                           f"2. Poppler መንገድ ትክክል ነው።\n"
                           f"3. PDF ፋይል ትክክል ነው።")
-            self.status_var.set("ስህተት ተከስቷል")
-            self.progress_var.set(0)
-            self.root.after(0, lambda: self.convert_btn.config(state=tk.NORMAL))
+            self.bus.set("status", self.status_var.set, "ስህተት ተከስቷል")
+            self.bus.set("progress", self.progress_var.set, 0)
+            self.bus.call(self.convert_btn.config, {"state": tk.NORMAL})
             
-    def update_preview(self, text):
-        """Update the text preview area"""
-        self.text_preview.delete(1.0, tk.END)
-        self.text_preview.insert(1.0, text)
+    def on_progress(self, done, total, rate, eta):
+        """OCR progress from the bus (at most once per frame)"""
+        self.progress_var.set(int(30 + (done / max(1, total)) * 60))
+        self.status_var.set(f"OCR: ገጽ {done}/{total} ተነቧል... | {rate:.2f} ገጽ/ሰ | "
+                            f"ቀሪ ጊዜ: {format_eta(eta)}")
         
-        # Highlight Amharic text (simple detection - could be improved)
-        self.highlight_amharic()
-        
-    def highlight_amharic(self):
-        """Simple Amharic text highlighting"""
-        text_content = self.text_preview.get(1.0, tk.END)
-        
-        # Clear previous tags
-        for tag in self.text_preview.tag_names():
-            if tag != "sel":
-                self.text_preview.tag_remove(tag, 1.0, tk.END)
+    def update_preview(self, text):
+        """Replace the preview text"""
+        self.preview.set_text(text)
         
-        # Simple Amharic character range (Unicode)
-        amharic_range = r'[\u1200-\u137F]'
+    def append_preview(self, text):
+        """Add text to the end of the preview"""
+        self.preview.append(text)
         
-        # This is a simple implementation - for production, use regex
-        # Here we'll just tag the entire text if it contains Amharic
-        if any('\u1200' <= char <= '\u137F' for char in text_content):
-            self.text_preview.tag_add("amharic", 1.0, tk.END)
-            
     def clear_all(self):
         """Clear all fields and reset the application"""
         self.pdf_path.set("")
         self.output_path.set(os.path.join(os.path.expanduser("~"), "Desktop", "extracted_amharic.txt"))
-        self.text_preview.delete(1.0, tk.END)
+        self.preview.clear()
         self.progress_var.set(0)
         self.status_var.set("ምንም አልተጫነም")
         self.update_stats("ምንም አልተጫነም")
@@ -491,17 +544,7 @@ After installation, restart the application."""
         
 
 def main():
-    # Check if Tesseract is installed
-    try:
-        pytesseract.get_tesseract_version()
-    except Exception as e:
-        messagebox.showerror("ስህተት", 
-                           "Tesseract OCR አልተገኘም!\n\nእባክዎ የሚከተሉትን ያግኙ:\n"
-                           "1. Tesseract OCR ከዚህ ያውርዱ: https://github.com/UB-Mannheim/tesseract/wiki\n"
-                           "2. Amharic ቋንቋ መለያ ያክሉ: https://github.com/tesseract-ocr/tessdata\n"
-                           "3. መቀመጫውን ያረጋግጡ: pytesseract.pytesseract.tesseract_cmd = r'C:\\Program Files\\Tesseract-OCR\\tesseract.exe'")
-        return
-        
+    # Tesseract and Poppler are checked in the background after startup
     root = tk.Tk()
     app = PDFAmharicExtractor(root)
     
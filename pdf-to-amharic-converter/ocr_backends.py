@@ -0,0 +1,91 @@
+"""OCR backends.
+
+``pytesseract`` starts a tesseract process for every page, writes the page
+to a temporary image file and reloads ``amh.traineddata`` each time, which
+costs hundreds of milliseconds before recognition even starts. The
+``tesserocr`` backend drives the Tesseract C++ API in-process instead: each
+worker thread keeps one API object with the Amharic model loaded and hands
+it raw pixel buffers directly. tesserocr releases the GIL while
+recognising, so worker threads run in parallel.
+
+``create_backend("auto")`` picks tesserocr when it is installed and falls
+back to pytesseract otherwise.
+"""
+import os
+import threading
+
+BACKENDS = ("auto", "tesserocr", "pytesseract")
+
+
+class PytesseractBackend:
+    """One tesseract subprocess per page (always available)"""
+
+    name = "pytesseract"
+
+    def __init__(self, lang):
+        import pytesseract
+        self._pytesseract = pytesseract
+        self.lang = lang
+
+    def recognize(self, image):
+        return self._pytesseract.image_to_string(image, lang=self.lang)
+
+    def close(self):
+        pass
+
+
+class TesserocrBackend:
+    """In-process Tesseract; the model is loaded once per worker thread"""
+
+    name = "tesserocr"
+
+    def __init__(self, lang, tessdata_path=None):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self.lang = lang
+        self.tessdata_path = tessdata_path or os.environ.get("TESSDATA_PREFIX")
+        self._local = threading.local()
+        self._apis = []
+        self._lock = threading.Lock()
+
+    def _api(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            kwargs = {"lang": self.lang}
+            if self.tessdata_path:
+                kwargs["path"] = self.tessdata_path
+            api = self._tesserocr.PyTessBaseAPI(**kwargs)
+            self._local.api = api
+            with self._lock:
+                self._apis.append(api)
+        return api
+
+    def recognize(self, image):
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("L")
+        bytes_per_pixel = 1 if image.mode == "L" else 3
+
+        api = self._api()
+        # Raw pixels straight into Tesseract; no encode/decode or temp file
+        api.SetImageBytes(image.tobytes(), image.width, image.height,
+                          bytes_per_pixel, image.width * bytes_per_pixel)
+        return api.GetUTF8Text()
+
+    def close(self):
+        with self._lock:
+            for api in self._apis:
+                api.End()
+            self._apis.clear()
+
+
+def create_backend(name="auto", lang="amh"):
+    """Build the named backend; ``auto`` prefers tesserocr"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    if name in ("auto", "tesserocr"):
+        try:
+            return TesserocrBackend(lang)
+        except ImportError:
+            if name == "tesserocr":
+                raise
+    return PytesseractBackend(lang)
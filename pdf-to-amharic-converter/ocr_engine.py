@@ -0,0 +1,181 @@
+"""Parallel page-level OCR.
+
+A single Tesseract recognition mostly keeps one core busy, so pages are
+OCR'd concurrently on a pool of worker threads. With the pytesseract
+backend the threads only wait on their tesseract process; the tesserocr
+backend releases the GIL while recognising (see ocr_backends.py).
+``OMP_THREAD_LIMIT`` is exported so N workers don't each spin up an
+OpenMP team the size of the machine.
+
+The pool and the backend (and with it each thread's loaded model) live as
+long as the engine, so one engine can serve many documents; call
+``close()`` when done.
+
+With a ``LayoutConfig`` only the text blocks found by layout.py are
+OCR'd, one crop at a time in reading order, instead of the whole page.
+
+Results come back in completion order together with their page number;
+``ocr_in_order`` collects them keyed and sorted by page number.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from layout import TextBlock, find_text_blocks, page_bbox
+from ocr_backends import create_backend
+from preprocess import preprocess_page
+from rasterizer import DEFAULT_DPI
+
+DEFAULT_LANG = 'amh'
+
+
+def default_workers():
+    """OCR workers to use; override with AMHARIC_OCR_WORKERS"""
+    configured = os.environ.get("AMHARIC_OCR_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    return os.cpu_count() or 1
+
+
+class OCREngine:
+    """Runs OCR for many pages across a worker pool"""
+
+    def __init__(self, workers=None, lang=DEFAULT_LANG, omp_thread_limit=1,
+                 preprocess=None, dpi=DEFAULT_DPI, render=None, backend="auto",
+                 layout=None, keep_blocks=False):
+        self.workers = max(1, workers or default_workers())
+        self.lang = lang
+        self.omp_thread_limit = omp_thread_limit
+        # Preprocessing runs in the worker threads, next to OCR
+        self.preprocess = preprocess
+        self.dpi = dpi
+        # render(page_no, dpi) lets adaptive DPI re-render small-text pages
+        self.render = render
+        self.layout = layout
+        # With keep_blocks, each page's TextBlocks wait in ``blocks`` until
+        # the caller pops them
+        self.keep_blocks = keep_blocks
+        self.blocks = {}
+        self._cancelled = False
+        self._pool = None
+
+        # Read by tesseract (process or library) when OpenMP starts up, so
+        # it has to be set before the backend is created
+        if omp_thread_limit:
+            os.environ["OMP_THREAD_LIMIT"] = str(omp_thread_limit)
+        self.backend = create_backend(backend, lang)
+
+    def cancel(self):
+        self._cancelled = True
+
+    def close(self):
+        """Stop the worker threads and release the backend's models"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def params(self):
+        """Everything that affects the recognised text (for cache keys)"""
+        return {
+            "lang": self.lang,
+            "dpi": self.dpi,
+            "backend": self.backend.name,
+            "preprocess": self.preprocess.as_dict() if self.preprocess else None,
+            "layout": self.layout.as_dict() if self.layout else None,
+        }
+
+    def prepare(self, page_no, image):
+        """Preprocessed page and the ``info`` dict from ``preprocess_page``"""
+        if self.preprocess is None:
+            return image, {"dpi": self.dpi, "scale": 1.0, "skew": 0.0, "size": image.size}
+        render = None
+        if self.render is not None:
+            render = lambda dpi: self.render(page_no, dpi)
+        return preprocess_page(image, self.preprocess, self.dpi, render)
+
+    def ocr_blocks(self, image, info=None):
+        """OCR each text block of a prepared page; bboxes are mapped back to
+        the rendered page through ``info`` (see layout.page_bbox)"""
+        info = info or {}
+        blocks = []
+        for bbox in find_text_blocks(image, self.layout):
+            text = self.backend.recognize(image.crop(bbox)).strip()
+            if text:
+                blocks.append(TextBlock(page_bbox(bbox, image.size, info), text))
+        return blocks
+
+    def ocr_page(self, page_no, image):
+        image, info = self.prepare(page_no, image)
+        if self.layout is None:
+            return self.backend.recognize(image)
+
+        blocks = self.ocr_blocks(image, info)
+        if self.keep_blocks:
+            self.blocks[page_no] = blocks
+        return "\n\n".join(block.text for block in blocks) + "\n"
+
+    def run(self, pages, return_exceptions=False):
+        """OCR ``(page_no, image)`` pairs; yields ``(page_no, text)`` as pages finish.
+
+        ``pages`` is consumed lazily and at most two pages per worker are in
+        flight, so a streaming page source is never read far ahead. Page keys
+        only have to be hashable (batch runs use ``(document, page_no)``).
+        With ``return_exceptions`` a failed page yields its exception in
+        place of the text instead of ending the run.
+        """
+        max_in_flight = self.workers * 2
+        pages = iter(pages)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="ocr")
+        in_flight = {}
+        exhausted = False
+        try:
+            while in_flight or not exhausted:
+                while not exhausted and not self._cancelled and len(in_flight) < max_in_flight:
+                    try:
+                        page_no, image = next(pages)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    in_flight[self._pool.submit(self.ocr_page, page_no, image)] = page_no
+
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page_no = in_flight.pop(future)
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        if not return_exceptions:
+                            raise
+                        text = e
+                    yield page_no, text
+
+                if self._cancelled:
+                    break
+        finally:
+            # Don't leave queued pages behind for the next run
+            for future in in_flight:
+                future.cancel()
+
+
+def ocr_in_order(engine, pages, on_page=None):
+    """OCR all pages and return ``{page_no: text}`` sorted by page number.
+
+    ``on_page(page_no, text, done_count)`` is called as each page finishes.
+    """
+    texts = {}
+    for page_no, text in engine.run(pages):
+        texts[page_no] = text
+        if on_page:
+            on_page(page_no, text, len(texts))
+    return dict(sorted(texts.items()))
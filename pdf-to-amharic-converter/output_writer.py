@@ -0,0 +1,83 @@
+"""Incremental, ordered output writer.
+
+Pages finish out of order when OCR runs in parallel. The writer keeps only
+the pages that are waiting on an earlier one, writes every page as soon as
+all pages before it are written, and keeps word and character counts as
+it goes. Output goes to a temporary file next to the target and is renamed
+into place on commit, so a crash never leaves a half-written file behind.
+"""
+import os
+import tempfile
+
+PAGE_TEMPLATE = "\n--- ገጽ {page_no} ---\n{text}\n"
+
+
+class OrderedPageWriter:
+    """Writes pages 1..total_pages in order while they arrive in any order.
+
+    Pages added without text are read through ``load_page(page_no)`` when
+    their turn comes, so already-stored pages don't have to sit in memory.
+    ``on_write(page_no, chunk)`` sees every chunk as it is written.
+    """
+
+    def __init__(self, output_path, total_pages, load_page=None, on_write=None):
+        self.output_path = output_path
+        self.total_pages = total_pages
+        self.load_page = load_page
+        self.on_write = on_write
+        self.next_page = 1
+        self.chars = 0
+        self.words = 0
+        self._pending = {}
+
+        directory = os.path.dirname(os.path.abspath(output_path))
+        fd, self._tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._file = os.fdopen(fd, "w", encoding="utf-8")
+
+    def add(self, page_no, text=None):
+        """Mark a page as finished and flush everything that is now in order"""
+        self._pending[page_no] = text
+        while self.next_page in self._pending:
+            text = self._pending.pop(self.next_page)
+            if text is None:
+                text = self.load_page(self.next_page)
+            self._write(self.next_page, text)
+            self.next_page += 1
+
+    def _write(self, page_no, text):
+        chunk = PAGE_TEMPLATE.format(page_no=page_no, text=text)
+        self._file.write(chunk)
+        self.chars += len(chunk)
+        # Chunks start and end with a newline, so per-chunk counts add up
+        # to the count for the whole document
+        self.words += len(chunk.split())
+        if self.on_write:
+            self.on_write(page_no, chunk)
+
+    @property
+    def complete(self):
+        return self.next_page > self.total_pages
+
+    def commit(self):
+        """Flush to disk and atomically move the file into place"""
+        if not self.complete:
+            raise RuntimeError(f"page {self.next_page} of {self.total_pages} was never added")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.output_path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
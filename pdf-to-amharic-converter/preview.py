@@ -0,0 +1,84 @@
+"""Incremental text preview.
+
+Text is appended to the end of the ``Text`` widget instead of replacing
+its whole content, and only the newly added text is highlighted: a regex
+splits each chunk into Ethiopic and other runs, and the chunk goes into
+the widget in one ``insert`` call that carries the tag for every run.
+Appends are buffered and written once per ``flush`` (the app calls it
+once per UI tick), and the widget keeps at most ``max_chars`` characters;
+older text is dropped from the top since the full text is in the output
+file anyway.
+"""
+import re
+import tkinter as tk
+
+ETHIOPIC_RUN_RE = re.compile(r'[\u1200-\u137F]+(?:\s+[\u1200-\u137F]+)*')
+
+MAX_PREVIEW_CHARS = 200_000
+TRIM_NOTICE = "[... ቀደም ያለው ጽሑፍ በውጤት ፋይሉ ውስጥ ይገኛል ...]\n"
+
+
+def tagged_segments(text, tag):
+    """``insert`` arguments: alternating text runs and their tag tuples"""
+    args = []
+    pos = 0
+    for match in ETHIOPIC_RUN_RE.finditer(text):
+        if match.start() > pos:
+            args += [text[pos:match.start()], ()]
+        args += [match.group(), (tag,)]
+        pos = match.end()
+    if pos < len(text):
+        args += [text[pos:], ()]
+    return args
+
+
+class TextPreview:
+    """Append-only, size-capped view over a Tk ``Text`` widget (UI thread only)"""
+
+    def __init__(self, widget, tag="amharic", max_chars=MAX_PREVIEW_CHARS):
+        self.widget = widget
+        self.tag = tag
+        self.max_chars = max_chars
+        self.widget.tag_configure("notice", foreground="gray")
+        self.chars = 0
+        self.trimmed = False
+        self._pending = []
+
+    def append(self, text):
+        self._pending.append(text)
+
+    def set_text(self, text):
+        self.clear()
+        self.append(text)
+
+    def clear(self):
+        self._pending.clear()
+        self.widget.delete("1.0", tk.END)
+        self.chars = 0
+        self.trimmed = False
+
+    def flush(self):
+        """Write the buffered text to the widget"""
+        text = "".join(self._pending)[-self.max_chars:]
+        self._pending.clear()
+        # insert() with no text raises TypeError
+        if not text:
+            return
+
+        # Only follow the new text if the user hasn't scrolled up
+        at_bottom = self.widget.yview()[1] >= 1.0
+        self.widget.insert(tk.END, *tagged_segments(text, self.tag))
+        self.chars += len(text)
+        if self.chars > self.max_chars:
+            self._trim()
+        if at_bottom:
+            self.widget.see(tk.END)
+
+    def _trim(self):
+        # Trim well below the cap so this doesn't run on every flush
+        excess = self.chars - int(self.max_chars * 0.8)
+        if not self.trimmed:
+            self.widget.insert("1.0", TRIM_NOTICE, ("notice",))
+            self.trimmed = True
+        self.widget.delete("2.0", f"2.0 + {excess} chars")
+        self.chars -= excess
@@ -0,0 +1,79 @@
+"""Streaming page rasterisation.
+
+``convert_from_path`` without a page range renders the whole document into
+memory before returning. Here pages are rendered a small window at a time
+(``first_page``/``last_page``) into a temporary folder, on tmpfs when one is
+available, and handed out one by one. OCR can start on page 1 right away
+and memory use no longer grows with the page count.
+"""
+import os
+import tempfile
+
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
+
+DEFAULT_DPI = 200
+DEFAULT_WINDOW = 4
+
+# RAM-backed scratch space on Linux; falls back to the normal temp dir
+TMPFS_DIR = "/dev/shm"
+
+
+def page_count(pdf_path, poppler_path=None):
+    """Number of pages in the PDF, via pdfinfo"""
+    info = pdfinfo_from_path(pdf_path, poppler_path=poppler_path)
+    return int(info["Pages"])
+
+
+def render_page(pdf_path, page_no, dpi=DEFAULT_DPI, poppler_path=None):
+    """Render a single page, e.g. again at a different DPI"""
+    return convert_from_path(pdf_path, dpi=dpi, first_page=page_no, last_page=page_no,
+                             poppler_path=poppler_path)[0]
+
+
+def _scratch_dir():
+    if os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK):
+        return TMPFS_DIR
+    return None
+
+
+def page_windows(page_numbers, window=DEFAULT_WINDOW):
+    """Group page numbers into (first, last) runs of at most ``window`` consecutive pages"""
+    runs = []
+    for page_no in sorted(page_numbers):
+        if runs and page_no == runs[-1][1] + 1 and page_no - runs[-1][0] < window:
+            runs[-1][1] = page_no
+        else:
+            runs.append([page_no, page_no])
+    return [tuple(run) for run in runs]
+
+
+def iter_pages(pdf_path, poppler_path=None, dpi=DEFAULT_DPI, window=DEFAULT_WINDOW,
+               first_page=1, last_page=None, page_numbers=None):
+    """Yield ``(page_no, image)`` for each page, rendering ``window`` pages at a time.
+
+    ``page_numbers`` restricts rendering to those pages; otherwise every
+    page from ``first_page`` to ``last_page`` is rendered.
+    """
+    if page_numbers is None:
+        if last_page is None:
+            last_page = page_count(pdf_path, poppler_path)
+        page_numbers = range(first_page, last_page + 1)
+
+    with tempfile.TemporaryDirectory(prefix="amharic_ocr_", dir=_scratch_dir()) as folder:
+        for start, end in page_windows(page_numbers, window):
+            paths = convert_from_path(
+                pdf_path,
+                dpi=dpi,
+                first_page=start,
+                last_page=end,
+                output_folder=folder,
+                fmt='ppm',
+                paths_only=True,
+                poppler_path=poppler_path,
+            )
+            for page_no, path in enumerate(paths, start):
+                with Image.open(path) as image:
+                    image.load()
+                os.remove(path)
+                yield page_no, image
@@ -0,0 +1,68 @@
+"""Native text-layer detection.
+
+Born-digital PDFs often already carry a Unicode Ethiopic text layer, and
+OCR'ing those pages only loses accuracy and time. Poppler's ``pdftotext``
+pulls the layer out of the whole document in one pass (pages are separated
+by form feeds), and each page's text is accepted only if enough of its
+letters are in the Ethiopic block (U+1200-U+137F). Pages that fail the
+check, like scans or legacy non-Unicode Amharic fonts that come out as
+Latin garbage, still go to OCR.
+"""
+import os
+import platform
+import re
+import subprocess
+
+ETHIOPIC_RE = re.compile(r'[\u1200-\u137F]')
+
+# A page needs at least this many Ethiopic characters...
+MIN_ETHIOPIC_CHARS = 20
+# ...and this share of its letters must be Ethiopic
+MIN_ETHIOPIC_RATIO = 0.6
+
+
+def pdftotext_command(poppler_path=None):
+    name = "pdftotext.exe" if platform.system() == "Windows" else "pdftotext"
+    return os.path.join(poppler_path, name) if poppler_path else name
+
+
+def extract_all_pages(pdf_path, poppler_path=None, first_page=1, last_page=None, timeout=120):
+    """Text layer of every page as a list (index 0 is ``first_page``)"""
+    cmd = [pdftotext_command(poppler_path), "-enc", "UTF-8", "-layout", "-f", str(first_page)]
+    if last_page:
+        cmd += ["-l", str(last_page)]
+    cmd += [pdf_path, "-"]
+
+    result = subprocess.run(cmd, capture_output=True, timeout=timeout, check=True)
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+    # pdftotext ends the last page with a form feed too
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return pages
+
+
+def is_ethiopic_text(text, min_chars=MIN_ETHIOPIC_CHARS, min_ratio=MIN_ETHIOPIC_RATIO):
+    """True if ``text`` looks like real Unicode Amharic"""
+    ethiopic = len(ETHIOPIC_RE.findall(text))
+    if ethiopic < min_chars:
+        return False
+    letters = sum(1 for char in text if char.isalpha())
+    return ethiopic / max(1, letters) >= min_ratio
+
+
+def usable_text_layer(pdf_path, total_pages, poppler_path=None):
+    """``{page_no: text}`` for pages whose text layer can replace OCR.
+
+    Returns an empty dict when pdftotext is unavailable or fails, which
+    simply means every page is OCR'd.
+    """
+    try:
+        pages = extract_all_pages(pdf_path, poppler_path, last_page=total_pages)
+    except (OSError, subprocess.SubprocessError):
+        return {}
+
+    return {
+        page_no: text
+        for page_no, text in enumerate(pages[:total_pages], 1)
+        if is_ethiopic_text(text)
+    }
@@ -0,0 +1 @@
+"""Helpers shared by the Tk apps in this repository."""
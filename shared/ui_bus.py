@@ -0,0 +1,171 @@
+"""Thread-safe, throttled UI update bus for Tk apps.
+
+Worker threads never touch widgets or Tk variables. They post to the bus,
+which only puts the event on a queue, and the Tk loop drains the queue at
+a fixed frame rate:
+
+- ``call(callback, *args)`` runs once, in order (dialogs, button states,
+  appending text);
+- ``set(key, callback, *args)`` is "latest wins": of all the updates for
+  one key posted within a frame only the last is applied, in the position
+  it was posted (status text);
+- ``progress(done, total)`` is coalesced the same way and also feeds a
+  throughput meter, so progress handlers get items/sec and an ETA.
+
+However fast the workers report, the Tk loop does at most one progress
+update per frame.
+"""
+import queue
+import sys
+import time
+from collections import deque
+
+DEFAULT_FPS = 20
+
+# Throughput is measured over the last few seconds so it follows speed changes
+RATE_WINDOW_SECONDS = 10.0
+# ...and not reported until this much time has been measured
+MIN_RATE_SECONDS = 1.0
+
+_CALL = "call"
+_SET = "set"
+# Key of the coalesced progress updates
+_PROGRESS = object()
+
+
+def format_eta(seconds):
+    """``m:ss`` (or ``h:mm:ss``) for an ETA in seconds, ``--:--`` if unknown"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class RateMeter:
+    """Items/sec over a sliding window, and the ETA for the remaining items"""
+
+    def __init__(self, window=RATE_WINDOW_SECONDS, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.reset()
+
+    def reset(self, total=None):
+        self.total = total
+        self.done = 0
+        self._samples = deque([(self.clock(), 0)])
+
+    def update(self, done, total=None):
+        now = self.clock()
+        if total is not None:
+            self.total = total
+        self.done = done
+        self._samples.append((now, done))
+        # Keep one sample older than the window as the baseline
+        while len(self._samples) > 2 and now - self._samples[1][0] > self.window:
+            self._samples.popleft()
+
+    @property
+    def rate(self):
+        """Items per second, or 0.0 until enough was measured"""
+        (start, first), (end, last) = self._samples[0], self._samples[-1]
+        if end - start < MIN_RATE_SECONDS or last <= first:
+            return 0.0
+        return (last - first) / (end - start)
+
+    @property
+    def eta(self):
+        """Seconds until ``total`` is reached, or None if unknown"""
+        rate = self.rate
+        if self.total is None or not rate:
+            return None
+        return max(0.0, (self.total - self.done) / rate)
+
+
+class UIBus:
+    """Queue between worker threads and the Tk loop (see module docstring)"""
+
+    def __init__(self, root, fps=DEFAULT_FPS):
+        self.root = root
+        self.interval_ms = max(1, int(1000 / fps))
+        self.meter = RateMeter()
+        self._queue = queue.SimpleQueue()
+        self._progress_handlers = []
+        self._frame_handlers = []
+        self._after_id = None
+
+    # Any thread
+
+    def call(self, callback, *args):
+        self._queue.put((_CALL, None, callback, args))
+
+    def set(self, key, callback, *args):
+        self._queue.put((_SET, key, callback, args))
+
+    def progress(self, done, total=None):
+        self._queue.put((_SET, _PROGRESS, self._apply_progress, (done, total)))
+
+    # Tk thread
+
+    def on_progress(self, handler):
+        """``handler(done, total, rate, eta)`` runs at most once per frame"""
+        self._progress_handlers.append(handler)
+
+    def on_frame(self, handler):
+        """``handler()`` runs after every drained frame (e.g. to flush buffered text)"""
+        self._frame_handlers.append(handler)
+
+    def start_job(self, total=None):
+        """Reset the throughput meter for a new run of ``total`` items"""
+        self.meter.reset(total)
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def drain(self):
+        """Apply everything posted since the last frame"""
+        actions = []
+        latest = {}
+        try:
+            while True:
+                kind, key, callback, args = self._queue.get_nowait()
+                if kind == _SET:
+                    # Only the newest update of a key runs, where it was posted
+                    if key in latest:
+                        actions[latest[key]] = None
+                    latest[key] = len(actions)
+                actions.append((callback, args))
+        except queue.Empty:
+            pass
+
+        for action in actions:
+            if action is not None:
+                callback, args = action
+                self._run(callback, *args)
+        for handler in self._frame_handlers:
+            self._run(handler)
+
+    def _apply_progress(self, done, total):
+        self.meter.update(done, total)
+        for handler in self._progress_handlers:
+            handler(done, self.meter.total, self.meter.rate, self.meter.eta)
+
+    def _run(self, callback, *args):
+        # One failing update must not drop the rest of the frame
+        try:
+            callback(*args)
+        except Exception:
+            self.root.report_callback_exception(*sys.exc_info())
+
+    def _tick(self):
+        self.drain()
+        self._after_id = self.root.after(self.interval_ms, self._tick)